@@ -3,6 +3,8 @@ import logging
 from livekit import rtc
 from .session_data import SessionData
 import asyncio
+import config
+from tools.tracing import bind_turn, span
 
 logger = logging.getLogger("livekit.BASE_AGENT")
 logger.info("BASE_AGENT")
@@ -18,22 +20,49 @@ class BaseChatAgent(Agent):
     async def _exit_after_timeout(self, seconds: int):
             try:
                 await asyncio.sleep(seconds)
-                logger.info(f"No user activity for {seconds}s. Closing session...")
+                logger.info("No user activity for %ss. Closing session...", seconds)
                 await self.session.aclose()  # ends agent session
                 # await self.room.disconnect()
             except asyncio.CancelledError:
                 pass
 
+    async def _bound_chat_ctx(self, turn_ctx: llm.ChatContext):
+        """
+        Keeps the LLM context at a constant size: the instructions, the rolling summary of
+        older turns, then the last CHAT_CONTEXT_MAX_ITEMS items.
+        """
+        max_items = config.CHAT_CONTEXT_MAX_ITEMS
+        if len(self.chat_ctx.items) > max_items + 1:
+            await self.update_chat_ctx(self.chat_ctx.copy().truncate(max_items=max_items))
+        turn_ctx.truncate(max_items=max_items)
+
+        summary = self.session_data.chat_history.summary
+        if summary:
+            # Only added to this turn's context, so it never accumulates
+            start = 1 if turn_ctx.items and turn_ctx.items[0].type == "message" and turn_ctx.items[0].role == "system" else 0
+            turn_ctx.items.insert(start, llm.ChatMessage(
+                role="system",
+                content=[f"Summary of the earlier conversation: {summary}"],
+            ))
+
     async def on_user_turn_completed(
         self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage
     ) -> None:
-        logger.info(f"chat_history after user turn completed :: {self.session_data.chat_history}")
-        logger.info(f"User turn completed : {new_message}")
+        self.session_data.turn_index += 1
+        # Tags this span and the llm/tts/tool spans livekit starts for the reply with the turn
+        bind_turn(type(self).__name__, self.session_data.turn_index)
+        with span("user_turn_completed"):
+            await self._on_user_turn_completed(turn_ctx, new_message)
+
+    async def _on_user_turn_completed(
+        self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage
+    ) -> None:
+        logger.debug("User turn completed (turn %d)", self.session_data.turn_index)
 
         text = new_message.content[0]
-        self.session_data.chat_history.append({"role": "user", "content": text})
+        self.session_data.record_turn("user", text)
+        await self._bound_chat_ctx(turn_ctx)
 
-        logger.info(f"chat :: {self.chat_ctx}")
         last_item = self.chat_ctx.items[-1]
 
         if "parent mode" in text.lower() or "parental mode" in text.lower() or "parent" in text.lower():
@@ -48,8 +77,8 @@ class BaseChatAgent(Agent):
             if last_item.role == "assistant":
                 text = last_item.text_content
                 if text:
-                    self.session_data.chat_history.append({"role": "assistant", "content": text})
-                    logger.info(f"Saved assistant msg: {text}")
+                    self.session_data.record_turn("assistant", text)
+                    logger.debug("Saved assistant msg: %s", text)
         else:
             pass
         if self._exit_timer and not self._exit_timer.done():
@@ -8,7 +8,7 @@ from livekit.agents.voice.agent_activity import AgentActivity, _EndOfTurnInfo
 from agents.session_data import SessionData
 from prompts.system_prompts import (
     CONVERSATION_CONTINUATION_AGENT_PROMPT,
-    create_assistant_prompt,
+    compile_assistant_prompt,
 )
 from typing import Optional
 from tools.agent_tools import exit_session, get_data, generate_query_summary
@@ -47,7 +47,7 @@ class ConversationContinuationAgent(BaseChatAgent):
             ]
             query = await generate_query_summary(messages_for_rag)
 
-        logger.info(f"Final RAG input: {query}")
+        logger.info("Final RAG input: %s", query)
 
         # Call your DB
         result = await get_data(session_data=self.session_data, message=query)
@@ -60,18 +60,12 @@ class ConversationContinuationAgent(BaseChatAgent):
         sd = self.session_data
         logger.info("Building full system prompt for continuation agent...")
 
-        full_prompt = create_assistant_prompt(
-            child_profile=sd.child_profile,
-            personality=sd.personality,
-            parental_rules=sd.parental_instructions,
-            chat_history=sd.last_messages,
-        )
+        full_prompt = compile_assistant_prompt(sd)
         # full_prompt = f"{CONVERSATION_CONTINUATION_AGENT_PROMPT}\n\n{full_prompt}"
         
-        logger.debug(f"Full system prompt: {full_prompt}")
+        logger.debug("Full system prompt: %s", full_prompt)
         await self.update_instructions(full_prompt)
         logger.info("LLM instructions set for continuation.")
-        logger.info(f"Continumm ::: {self.session}")
 
     async def on_user_turn_completed(
         self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from collections import deque
+
+import config
+from tools.summariser_tool import update_rolling_summary
+
+logger = logging.getLogger("livekit.conversation_memory")
+
+
+class ConversationMemory:
+    """
+    Bounded record of a session's conversation: the last `max_turns` turns verbatim,
+    plus a rolling summary of the turns pushed out of that window. The summary is
+    updated in the background every `summarize_every` evicted turns, so neither the
+    memory nor anything built from it grows with the length of the session.
+    """
+
+    def __init__(self, max_turns: int | None = None, summarize_every: int | None = None):
+        self.turns: deque[dict] = deque(maxlen=max_turns or config.CHAT_HISTORY_TURNS)
+        self.summarize_every = summarize_every or config.CHAT_SUMMARY_EVERY
+        self.summary = ""
+        self.turn_count = 0
+        # Turns evicted from the window and not yet folded into the summary
+        self._evicted: list[dict] = []
+        self._task: asyncio.Task | None = None
+
+    def __len__(self):
+        return self.turn_count
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def append(self, role: str, content: str):
+        if len(self.turns) == self.turns.maxlen:
+            self._evicted.append(self.turns[0])
+        self.turns.append({"role": role, "content": content})
+        self.turn_count += 1
+        if len(self._evicted) >= self.summarize_every and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._summarize())
+
+    async def _summarize(self):
+        batch, self._evicted = self._evicted, []
+        try:
+            self.summary = await update_rolling_summary(self.summary, batch)
+        except Exception as e:
+            logger.warning("Rolling summary update failed, will retry with the next turns: %s", e)
+            # Kept for the next attempt, but never more than one window's worth
+            self._evicted = (batch + self._evicted)[-self.turns.maxlen:]
+
+    def transcript(self) -> list[dict]:
+        """The whole session in bounded form: the summary as a leading turn, then every unsummarized turn."""
+        head = [{"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}] if self.summary else []
+        return head + self._evicted + list(self.turns)
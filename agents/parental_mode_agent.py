@@ -2,33 +2,29 @@ import logging
 from livekit.agents import Agent, RunContext, llm, AgentSession
 from livekit.rtc import Room
 from agents.session_data import SessionData
-from prompts.system_prompts import PARENTAL_PREFERENCE_AGENT_PROMPT
+from prompts.system_prompts import PARENTAL_PREFERENCE_AGENT_PROMPT, compile_parental_prompt
 from livekit.agents.llm import ChatMessage
-from tools.supabase_tools import SupabaseHelper
+from tools.supabase_tools import SupabaseHelper, get_db
 from tools.parental_agent_tools import PARENTAL_RULE_TOOLS
 import asyncio
 
 logger = logging.getLogger("livekit.parental_mode_agent")
 
 class ParentalModeAgent(Agent):
-    def __init__(self, room: Room, session_data: SessionData):
+    def __init__(self, room: Room, session_data: SessionData, db: SupabaseHelper | None = None):
         super().__init__(
             instructions=PARENTAL_PREFERENCE_AGENT_PROMPT,
             tools=PARENTAL_RULE_TOOLS,
         )
         self.room = room
         self.session_data = session_data
-        self.supabase = SupabaseHelper()
+        self.supabase = db or get_db()
         self.device_id = session_data.device_id
 
     async def on_enter(self):
-        logger.info(f"ParentalModeAgent started for device_id: {self.device_id}")
+        logger.info("ParentalModeAgent started for device_id: %s", self.device_id)
         
-        updated_prompt = PARENTAL_PREFERENCE_AGENT_PROMPT.format(
-            device_id=self.device_id,
-            conversation_logs=self.session_data.last_messages,
-            child_profile=self.session_data.child_profile
-        )
+        updated_prompt = compile_parental_prompt(self.session_data)
         await self.update_instructions(updated_prompt)
 
         await self.session.say(
@@ -1,5 +1,6 @@
 import logging
 import json
+import time
 from livekit.agents import Agent, JobContext, RunContext, function_tool, llm
 from livekit.agents.llm import ChatMessage, ChatContext
 from livekit.plugins.openai import LLM as OpenAI_LLM
@@ -8,6 +9,7 @@ from .user_agent import UserAgent
 from .parental_mode_agent import ParentalModeAgent
 from .session_data import SessionData
 from tools.supabase_tools import SupabaseHelper
+from tools.intent_classifier import intent_classifier, USER, PARENTAL, CONVERSATION
 import config
 from prompts.system_prompts import ROUTER_AGENT_PROMPT
 from livekit import rtc
@@ -59,7 +61,20 @@ class RouterAgent(Agent):
         return "Conversation Agent selected."
 
     async def on_user_turn_completed(self, ctx: llm.ChatContext, new_message: llm.ChatMessage):
-        logger.info(f"Processing user message: {new_message.text_content}")
+        logger.debug("Processing user message: %s", new_message.text_content)
+
+        # Obvious cases are routed locally, without an LLM round trip
+        decision = await intent_classifier.classify(new_message.text_content or "")
+        if decision.intent is not None:
+            routes = {
+                USER: self.route_to_user_agent,
+                PARENTAL: self.route_to_parental_agent,
+                CONVERSATION: self.route_to_conversation_agent,
+            }
+            await routes[decision.intent](context=RunContext(session=self.session))
+            return
+
+        llm_started = time.perf_counter()
         
         # Create a chat context for intent classification
         chat_context = ChatContext(messages=[
@@ -81,7 +96,13 @@ class RouterAgent(Agent):
             if response.choices and response.choices[0].tool_calls:
                 tool_call = response.choices[0].tool_calls[0]
                 tool_name = tool_call.function_name
-                logger.info(f"LLM selected tool: {tool_name}")
+                logger.info("LLM selected tool: %s", tool_name)
+                intent = {
+                    "route_to_user_agent": USER,
+                    "route_to_parental_agent": PARENTAL,
+                    "route_to_conversation_agent": CONVERSATION,
+                }.get(tool_name)
+                intent_classifier.record("llm", intent, time.perf_counter() - llm_started, 1.0)
                 
                 if tool_name == "route_to_user_agent":
                     await self.route_to_user_agent(context=RunContext(session=self.session))
@@ -90,14 +111,14 @@ class RouterAgent(Agent):
                 elif tool_name == "route_to_conversation_agent":
                     await self.route_to_conversation_agent(context=RunContext(session=self.session))
                 else:
-                    logger.warning(f"Unknown tool: {tool_name}, defaulting to Conversation Agent")
+                    logger.warning("Unknown tool: %s, defaulting to Conversation Agent", tool_name)
                     await self.route_to_conversation_agent(context=RunContext(session=self.session))
             else:
                 # Default to Conversation Agent if no tool is called
                 logger.info("No tool called, defaulting to Conversation Agent")
                 await self.route_to_conversation_agent(context=RunContext(session=self.session))
         except Exception as e:
-            logger.error(f"Error processing user message: {e}")
+            logger.error("Error processing user message: %s", e)
             await self.session.say(
                 text="Sorry, I couldn't process your request. Let's start a conversation instead."
             )
@@ -1,6 +1,7 @@
 # in agent/session_data.py
 from dataclasses import dataclass, field
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from .conversation_memory import ConversationMemory
 
 @dataclass
 class SessionData:
@@ -8,7 +9,7 @@ class SessionData:
     device_id: str
     is_new_user: bool
     child_profile: Dict[str, Any] = field(default_factory=dict)
-    chat_history: list = field(default_factory=list)
+    chat_history: ConversationMemory = field(default_factory=ConversationMemory)
 
     user_name: str | None = None
     age: int | None = None
@@ -19,4 +20,21 @@ class SessionData:
     parental_instructions: Dict[str, Any] = field(default_factory=dict)
     preferences: Dict[str, Any] = field(default_factory=dict)
     personality: str | None = None
-    last_messages: list = field(default_factory=list)
\ No newline at end of file
+    last_messages: list = field(default_factory=list)
+    # tools.transcript_writer.TranscriptWriter persisting every turn as it arrives
+    transcript: Optional[Any] = None
+    # agents.user_interests_agent.InterestTracker extracting interests as turns arrive
+    interest_tracker: Optional[Any] = None
+    # Per-child prompt sections built for this session, see prompts.system_prompts._memoized
+    prompt_sections: Dict[Any, str] = field(default_factory=dict)
+    # Number of completed user turns, used to tag this session's trace spans
+    turn_index: int = 0
+    # Set once the post-session work has been handed to the job spool
+    ended: bool = False
+
+    def record_turn(self, role: str, content: str):
+        self.chat_history.append(role, content)
+        if self.transcript is not None:
+            self.transcript.append(role, content)
+        if self.interest_tracker is not None:
+            self.interest_tracker.observe({"role": role, "content": content})
\ No newline at end of file
@@ -6,20 +6,20 @@ from livekit.agents import llm, AgentSession
 from livekit.rtc import Room
 from prompts import system_prompts
 from .session_data import SessionData
-from tools.supabase_tools import SupabaseHelper, save_user_data_to_backend
+from tools.supabase_tools import SupabaseHelper, get_db, save_user_data_to_backend
 from .base_agent import BaseChatAgent
 
 logger = logging.getLogger("livekit.user_agent")
 
 class UserAgent(BaseChatAgent):
-    def __init__(self, room: Room, session_data: SessionData):
+    def __init__(self, room: Room, session_data: SessionData, db: SupabaseHelper | None = None):
         super().__init__(instructions=system_prompts.USER_AGENT_PROMPT, room=room, session_data=session_data)
         self.room = room
         self.session_data = session_data
-        self.db_helper = SupabaseHelper()
+        self.db_helper = db or get_db()
 
     async def on_enter(self):
-        logging.info("User agent activated.")
+        logger.info("User agent activated.")
         await self.session.generate_reply(
             user_input="Hi, how are you? It's great to see you."
         )
@@ -72,7 +72,7 @@ class UserAgent(BaseChatAgent):
         context.userdata.dob = birth_date.date().isoformat()
         context.userdata.age = int(age)
 
-        logging.info(f"DOB parsed: {context.userdata.dob}; Age: {context.userdata.age}")
+        logger.info("DOB parsed: %s; Age: %s", context.userdata.dob, context.userdata.age)
         return f"Date of birth recorded; age calculated as {age}."
 
     # ------------------------
@@ -103,7 +103,7 @@ class UserAgent(BaseChatAgent):
         to save the user's profile.
         """
         ud: SessionData = context.userdata
-        logging.info(f"Saving user data for device: {ud.device_id}, name: {ud.user_name}")
+        logger.info("Saving user data for device: %s, name: %s", ud.device_id, ud.user_name)
 
         payload = {
             "device_id": ud.device_id,
@@ -116,10 +116,10 @@ class UserAgent(BaseChatAgent):
 
         try:
             await save_user_data_to_backend(payload)
-            logging.info("Profile created successfully in backend.")
+            logger.info("Profile created successfully in backend.")
             return "User profile saved."
         except Exception as e:
-            logging.error(f"Failed to create user profile via backend: {e}")
+            logger.error("Failed to create user profile via backend: %s", e)
             return (
                 "There was a problem saving the profile. Please tell the user we’ll try again later."
             )
@@ -1,97 +1,149 @@
+import asyncio
 import logging
-import json
 from livekit.agents import Agent, llm
 from livekit.plugins.openai import LLM as OpenAI_LLM
-from tools.supabase_tools import SupabaseHelper
+from pydantic import BaseModel
+import config
+from tools.supabase_tools import INTEREST_CATEGORIES, SupabaseHelper, dedupe_interests, get_db
 from prompts.system_prompts import USER_INTEREST_AGENT_PROMPT
+from tools.tracing import traced
+from tools.worker_metrics import timed_call
 
+logger = logging.getLogger("livekit.user_interests")
 
-class UserInterestAgent(Agent):
-    def __init__(self):
-        super().__init__(instructions=USER_INTEREST_AGENT_PROMPT, llm=OpenAI_LLM)
-        self.supabase = SupabaseHelper().client
-
-    async def process_message(self, message: str, user_id: str):
-        prompt = f"""
-        You are detecting personal interests from a child (age 4–12).
-        Sort the interests into one of these categories:
-        - Hobbies
-        - Sports
-        - Favorite_Food
-        - Topics
-
-        MESSAGE: "{message}"
-
-        Return JSON like this:
-        {{
-          "Hobbies": ["drawing", "lego"],
-          "Sports": ["football"],
-          "Favorite_Food": ["pizza"],
-          "Topics": ["dinosaurs"]
-        }}
-
-        If no interests, return empty arrays.
-        """
-
-        try:
-            # Build LLM chat context
-            chat_ctx = llm.ChatContext()
-            chat_ctx.add_message(role="user", content=prompt)
+INTEREST_EXTRACTION_PROMPT = """
+You are detecting personal interests from a child (age 4–12) in a conversation with their toy.
+Only count interests the child expresses, not things the toy suggests.
+Sort the interests into one of these categories:
+- Hobbies
+- Sports
+- Favorite_Food
+- Topics
 
-            result = await self.llm.chat(chat_ctx=chat_ctx)
-            text = result.message.content[0]
+Use short lowercase items like "lego" or "dinosaurs". If there are no interests, return empty arrays.
+"""
 
-            data = json.loads(text)
 
-            # Store category → items
-            for category, items in data.items():
-                if items:
-                    self._store_interests(user_id, category, items)
+class DetectedInterests(BaseModel):
+    # Schema the model's JSON output is constrained to and validated against
+    Hobbies: list[str]
+    Sports: list[str]
+    Favorite_Food: list[str]
+    Topics: list[str]
 
-        except Exception as e:
-            logging.error(f"Error extracting interests: {e}")
 
-    def _store_interests(self, user_id: str, category: str, new_items: list[str]):
-        """Insert/update interests by category for the user, avoid duplicates."""
+def _format_turns(turns: list[dict]) -> str:
+    # Long turns are clipped so one extraction costs a bounded number of tokens
+    limit = config.INTEREST_TURN_MAX_CHARS
+    return "\n".join(f"{turn['role']}: {turn['content'][:limit]}" for turn in turns)
 
-        record = (
-            self.supabase.table("user_interests")
-            .select("items")
-            .eq("user_id", user_id)
-            .eq("category", category)
-            .maybe_single()
-            .execute()
-        )
 
-        existing_items = record.data["items"] if record.data else []
-
-        # Merge without duplicates
-        merged_items = list(set(existing_items + new_items))
-
-        if record.data:
-            # Update existing row
-            self.supabase.table("user_interests") \
-                .update({"items": merged_items}) \
-                .eq("user_id", user_id) \
-                .eq("category", category) \
-                .execute()
-        else:
-            # Insert new row
-            self.supabase.table("user_interests") \
-                .insert({
-                    "user_id": user_id,
-                    "category": category,
-                    "items": merged_items
-                }) \
-                .execute()
-
-    def get_current_interests(self, user_id: str):
+class UserInterestAgent(Agent):
+    def __init__(self, db: SupabaseHelper | None = None):
+        super().__init__(instructions=USER_INTEREST_AGENT_PROMPT, llm=OpenAI_LLM(model="gpt-4o-mini"))
+        self.db = db or get_db()
+        self.supabase = self.db.client
+
+    @traced("llm.detect_interests")
+    @timed_call("openai", "detect_interests")
+    async def detect_interests(self, turns: list[dict]) -> dict[str, list[str]]:
+        """
+        Detects interests in a window of turns. The response is schema-constrained and
+        validated, so a malformed answer raises instead of silently yielding nothing.
+        """
+        chat_ctx = llm.ChatContext()
+        chat_ctx.add_message(role="system", content=INTEREST_EXTRACTION_PROMPT)
+        chat_ctx.add_message(role="user", content=_format_turns(turns))
+
+        stream = self.llm.chat(chat_ctx=chat_ctx, response_format=DetectedInterests)
+        text = "".join([delta async for delta in stream.to_str_iterable()])
+        return DetectedInterests.model_validate_json(text).model_dump()
+
+    async def detect_in_windows(self, turns: list[dict]) -> dict[str, list[str]]:
+        """Detects interests in any number of turns, INTEREST_WINDOW_TURNS at a time."""
+        window = config.INTEREST_WINDOW_TURNS
+        found = {category: [] for category in INTEREST_CATEGORIES}
+        for start in range(0, len(turns), window):
+            detected = await self.detect_interests(turns[start:start + window])
+            for category in INTEREST_CATEGORIES:
+                found[category].extend(detected[category])
+        return dedupe_interests(found)
+
+    async def get_current_interests(self, user_id: str):
         """Fetch all categories + items for a user."""
-        result = (
+        result = await self.db.execute(
+            "get_current_interests",
             self.supabase.table("user_interests")
             .select("category, items")
             .eq("user_id", user_id)
-            .execute()
         )
 
-        return {row["category"]: row["items"] for row in result.data}
\ No newline at end of file
+        return {row["category"]: row["items"] for row in result.data}
+
+
+_interest_agent: UserInterestAgent | None = None
+
+
+def get_interest_agent() -> UserInterestAgent:
+    """Process-wide interest extractor, created on first use."""
+    global _interest_agent
+    if _interest_agent is None:
+        _interest_agent = UserInterestAgent()
+    return _interest_agent
+
+
+class InterestTracker:
+    """
+    Extracts a session's interests in the background as the conversation goes.
+    Every INTEREST_EXTRACT_TURNS new turns, only the turns since the last extraction
+    (at most INTEREST_WINDOW_TURNS) are sent, and the results are merged into a
+    per-session set that is written once when the session ends.
+    """
+
+    def __init__(self, child_id: str, extractor: UserInterestAgent | None = None):
+        self.child_id = child_id
+        self.extractor = extractor
+        self.interests: dict[str, list[str]] = {category: [] for category in INTEREST_CATEGORIES}
+        # Turns not extracted yet, oldest first
+        self.pending: list[dict] = []
+        self._task: asyncio.Task | None = None
+
+    def observe(self, turn: dict):
+        self.pending.append(turn)
+        self._maybe_extract()
+
+    def _maybe_extract(self):
+        """Starts an extraction once enough new turns have accumulated, unless one is running."""
+        if self._task is not None and not self._task.done():
+            return
+        if len(self.pending) < config.INTEREST_EXTRACT_TURNS:
+            return
+        self._task = asyncio.create_task(self._extract(self.pending[:config.INTEREST_WINDOW_TURNS]))
+
+    async def _extract(self, turns: list[dict]):
+        try:
+            detected = await (self.extractor or get_interest_agent()).detect_interests(turns)
+        except Exception as e:
+            # The same turns are picked up by the next extraction, or at session end
+            logger.warning("Interest extraction failed for %s: %s", self.child_id, e)
+            return
+        self.merge(detected)
+        self.pending = self.pending[len(turns):]
+        self._task = None
+        self._maybe_extract()
+
+    def merge(self, detected: dict[str, list[str]]):
+        self.interests = dedupe_interests({
+            category: self.interests[category] + (detected.get(category) or [])
+            for category in INTEREST_CATEGORIES
+        })
+
+    def detach(self) -> dict:
+        """Stops extracting and returns what is left for the end-of-session job."""
+        if self._task is not None:
+            self._task.cancel()
+        return {
+            "child_id": self.child_id,
+            "interests": self.interests,
+            "turns": self.pending,
+        }
@@ -13,4 +13,126 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 BACKEND_URL = os.environ.get("BACKEND_URL")
 AGENT_AUTH_TOKEN = os.environ.get("AGENT_AUTH_TOKEN")
-POSTGRES_URL = os.environ.get("POSTGRES_URL")
\ No newline at end of file
+POSTGRES_URL = os.environ.get("POSTGRES_URL")
+
+# Session bootstrap
+BOOTSTRAP_TIMEOUT = float(os.environ.get("BOOTSTRAP_TIMEOUT", "2.5"))
+
+# Per-device session context cache, per process: it only carries over between a device's sessions
+# with JOB_EXECUTOR=thread, since job processes are single-use
+CONTEXT_CACHE_TTL = float(os.environ.get("CONTEXT_CACHE_TTL", "300"))
+CONTEXT_CACHE_MAX_DEVICES = int(os.environ.get("CONTEXT_CACHE_MAX_DEVICES", "1024"))
+
+# Background archival of old sessions, batched per process (across children only with JOB_EXECUTOR=thread)
+ARCHIVE_KEEP_SESSIONS = int(os.environ.get("ARCHIVE_KEEP_SESSIONS", "11"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "8"))
+ARCHIVE_BATCH_WINDOW = float(os.environ.get("ARCHIVE_BATCH_WINDOW", "0.5"))
+ARCHIVE_MAX_CONCURRENCY = int(os.environ.get("ARCHIVE_MAX_CONCURRENCY", "2"))
+
+# Speculative prefetch: rooms named "<prefix><device_id>" are prefetched by name
+PREFETCH_ROOM_PREFIX = os.environ.get("PREFETCH_ROOM_PREFIX")
+
+# Supabase access: threads for blocking calls and the shared HTTP connection pool, per worker process
+DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "8"))
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", str(DB_MAX_WORKERS)))
+DB_KEEPALIVE_EXPIRY = float(os.environ.get("DB_KEEPALIVE_EXPIRY", "30"))
+DB_HTTP_TIMEOUT = float(os.environ.get("DB_HTTP_TIMEOUT", "10"))
+
+# Embeddings: requests from the sessions in a process (all of the worker's with JOB_EXECUTOR=thread)
+# are batched over a short window
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "256"))
+# Longer inputs are refused before batching; kept under the API's 8191 since counts use the prompt encoding
+EMBED_MAX_INPUT_TOKENS = int(os.environ.get("EMBED_MAX_INPUT_TOKENS", "8000"))
+# A batch that fails for any reason but a rejected input (rate limit, timeout, 5xx) is retried once after this many seconds
+EMBED_RETRY_BACKOFF = float(os.environ.get("EMBED_RETRY_BACKOFF", "1"))
+EMBED_CACHE_MEMORY_ENTRIES = int(os.environ.get("EMBED_CACHE_MEMORY_ENTRIES", "5000"))
+EMBED_CACHE_DISK_ENTRIES = int(os.environ.get("EMBED_CACHE_DISK_ENTRIES", "100000"))
+# Directory for the memory-mapped float16 tier, shared by every worker process on the host;
+# set to empty to keep the cache in memory only
+EMBED_CACHE_DIR = os.environ.get("EMBED_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings"))
+if EMBED_CACHE_DIR:
+    EMBED_CACHE_DIR = os.path.abspath(EMBED_CACHE_DIR)
+
+# Answer memory lookups from an in-process copy of the child's embeddings instead of the RPC
+LOCAL_RAG_ENABLED = os.environ.get("LOCAL_RAG_ENABLED", "false").lower() == "true"
+
+# Conversation memory is embedded as overlapping windows of turns
+CHUNK_WINDOW_TURNS = int(os.environ.get("CHUNK_WINDOW_TURNS", "6"))
+CHUNK_OVERLAP_TURNS = int(os.environ.get("CHUNK_OVERLAP_TURNS", "2"))
+
+# Write-behind transcript persistence: flush after this many turns or seconds
+TRANSCRIPT_FLUSH_TURNS = int(os.environ.get("TRANSCRIPT_FLUSH_TURNS", "4"))
+TRANSCRIPT_FLUSH_INTERVAL = float(os.environ.get("TRANSCRIPT_FLUSH_INTERVAL", "15"))
+
+
+# Durable spool for post-session work (transcript tail, summary, interests), shared by the worker's processes
+SPOOL_PATH = os.path.abspath(os.environ.get("SPOOL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "post_session_spool.db")))
+SPOOL_WORKERS = int(os.environ.get("SPOOL_WORKERS", "2"))
+SPOOL_MAX_ATTEMPTS = int(os.environ.get("SPOOL_MAX_ATTEMPTS", "6"))
+SPOOL_RETRY_BACKOFF = float(os.environ.get("SPOOL_RETRY_BACKOFF", "2"))
+# Seconds a claimed job stays invisible to other workers before it is considered abandoned
+SPOOL_LEASE = float(os.environ.get("SPOOL_LEASE", "300"))
+SPOOL_DRAIN_TIMEOUT = float(os.environ.get("SPOOL_DRAIN_TIMEOUT", "10"))
+
+# Interests are extracted in the background every INTEREST_EXTRACT_TURNS new turns,
+# sending at most INTEREST_WINDOW_TURNS turns clipped to INTEREST_TURN_MAX_CHARS each
+INTEREST_EXTRACT_TURNS = int(os.environ.get("INTEREST_EXTRACT_TURNS", "6"))
+INTEREST_WINDOW_TURNS = int(os.environ.get("INTEREST_WINDOW_TURNS", "12"))
+INTEREST_TURN_MAX_CHARS = int(os.environ.get("INTEREST_TURN_MAX_CHARS", "500"))
+
+# Local intent routing: a centroid match is trusted above this cosine similarity and margin over the
+# runner-up; the turn's embedding must arrive within ROUTER_EMBED_TIMEOUT seconds or the LLM decides
+ROUTER_MIN_SIMILARITY = float(os.environ.get("ROUTER_MIN_SIMILARITY", "0.45"))
+ROUTER_MARGIN = float(os.environ.get("ROUTER_MARGIN", "0.05"))
+ROUTER_EMBED_TIMEOUT = float(os.environ.get("ROUTER_EMBED_TIMEOUT", "0.4"))
+
+# Token budget for assembled system prompts (static prefix included) and the tiktoken encoding to count with
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "2500"))
+PROMPT_TOKEN_ENCODING = os.environ.get("PROMPT_TOKEN_ENCODING", "o200k_base")
+
+# Conversation memory: turns kept verbatim, and how many evicted turns trigger a rolling summary update
+CHAT_HISTORY_TURNS = int(os.environ.get("CHAT_HISTORY_TURNS", "20"))
+CHAT_SUMMARY_EVERY = int(os.environ.get("CHAT_SUMMARY_EVERY", "6"))
+# Items kept in the LLM chat context, after the instructions
+CHAT_CONTEXT_MAX_ITEMS = int(os.environ.get("CHAT_CONTEXT_MAX_ITEMS", "24"))
+
+# Logging: levels for our loggers and for the livekit framework, text or json output, optional file,
+# per-logger sampling of sub-WARNING records ("livekit.agents=0.1,livekit.router=0.5"),
+# a size cap per message and the bound of the queue feeding the log writer thread
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LIVEKIT_LOG_LEVEL = os.environ.get("LIVEKIT_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_FILE = os.environ.get("LOG_FILE")
+LOG_SAMPLING = os.environ.get("LOG_SAMPLING")
+LOG_MAX_MESSAGE_CHARS = int(os.environ.get("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# Tracing: spans are written as JSON lines to TRACE_FILE and/or sent to OTEL_EXPORTER_OTLP_ENDPOINT;
+# tracing stays off when neither is set. Summarize with `python -m tools.trace_report <TRACE_FILE>`
+TRACE_FILE = os.environ.get("TRACE_FILE")
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "nijo-agent")
+
+# Worker metrics (/metrics): event loop lag probe interval and how often session/queue gauges are refreshed.
+# Set PROMETHEUS_MULTIPROC_DIR to aggregate the job processes' metrics
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.5"))
+METRICS_SAMPLE_INTERVAL = float(os.environ.get("METRICS_SAMPLE_INTERVAL", "5"))
+
+# Worker load reported to LiveKit: the highest of CPU, event loop lag over LOAD_MAX_LOOP_LAG seconds
+# and running jobs over LOAD_MAX_JOBS, smoothed over LOAD_WINDOW samples (0.5s apart).
+# At LOAD_THRESHOLD (must be below 1 in production) the worker is marked full and refuses new jobs
+LOAD_THRESHOLD = float(os.environ.get("LOAD_THRESHOLD", "0.75"))
+LOAD_MAX_LOOP_LAG = float(os.environ.get("LOAD_MAX_LOOP_LAG", "0.25"))
+LOAD_MAX_JOBS = int(os.environ.get("LOAD_MAX_JOBS", "8"))
+LOAD_WINDOW = int(os.environ.get("LOAD_WINDOW", "10"))
+
+# Job execution: "process" runs each session in its own prewarmed child process (VAD and clients
+# loaded once per process), "thread" runs them all in the worker process. WORKER_IDLE_PROCESSES
+# prewarmed processes are kept ready; jobs over JOB_MEMORY_WARN_MB are logged, over JOB_MEMORY_LIMIT_MB
+# (0 = no limit) killed
+JOB_EXECUTOR = os.environ.get("JOB_EXECUTOR", "process")
+WORKER_IDLE_PROCESSES = int(os.environ.get("WORKER_IDLE_PROCESSES", "3"))
+PROCESS_PREWARM_TIMEOUT = float(os.environ.get("PROCESS_PREWARM_TIMEOUT", "30"))
+JOB_MEMORY_WARN_MB = float(os.environ.get("JOB_MEMORY_WARN_MB", "600"))
+JOB_MEMORY_LIMIT_MB = float(os.environ.get("JOB_MEMORY_LIMIT_MB", "0"))
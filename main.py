@@ -1,68 +1,129 @@
+import sys
+
+# Installed first, so it sees every import below
+from tools.startup_profile import startup_profiler
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+if PROFILE_STARTUP:
+    startup_profiler.install()
+
+if __name__ == "__main__":
+    # Before livekit.agents, which imports prometheus_client; job processes inherit the setting
+    from tools.metrics_dir import prepare_metrics_dir
+    prepare_metrics_dir()
+
 import asyncio
 import json
 import logging
 import os
+import time
 from aiohttp import web
 
 from livekit import rtc
-from livekit.agents import JobContext, JobRequest, AgentSession, Worker, WorkerOptions
+from livekit.agents import JobContext, JobExecutorType, JobProcess, AgentSession, Worker, WorkerOptions
+# Plugins have to be imported on the main thread, where they register themselves;
+# the models and clients are only created by get_models()
 from livekit.plugins import silero
 from livekit.plugins.openai import LLM as OpenAI_LLM, TTS as OpenAI_TTS
 from livekit.plugins.deepgram import STT as Deepgram_STT
 
 import config
-from tools.supabase_tools import SupabaseHelper
-from tools.summariser_tool import summarize_last_sessions, archive_nth_last_session
+from tools.structured_logging import configure_logging
+from tools.tracing import setup_tracing, bind_session
+from tools.worker_metrics import worker_monitor, observe_pipeline, render_metrics
+from tools.worker_load import worker_load
+from tools.embedding_service import get_embedding_service
+from tools.embedding_cache import get_embedding_cache
+from tools.supabase_tools import get_db
+from tools.session_bootstrap import start_bootstrap, start_prefetch, take_prefetch, cancel_prefetch
+from tools.archive_queue import archive_queue
+from tools.vector_index import claim_index, release_index
+from tools.transcript_writer import TranscriptWriter, close_all_writers
+from tools.job_spool import job_spool
+from tools.agent_tools import exit_session
 from agents.session_data import SessionData
-from agents.conversation_starter_agent import ConversationStarterAgent
-from agents.user_agent import UserAgent
 from tools.agent_personality import personalities
-from agents.router_agent import RouterAgent
+from prompts.token_budget import load_encoding
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)-8s %(name)s %(message)s",
-)
-logging.getLogger("livekit").setLevel(logging.DEBUG)
-logging.getLogger("livekit.agents").setLevel(logging.DEBUG)
+with startup_profiler.step("configure_logging"):
+    configure_logging()
+with startup_profiler.step("setup_tracing"):
+    setup_tracing()
 logger = logging.getLogger("main")
 
-# --- Initialize global services ---
-llm = OpenAI_LLM(api_key=config.OPENAI_API_KEY)
-stt = Deepgram_STT(api_key=config.DEEPGRAM_API_KEY)
-tts = OpenAI_TTS(api_key=config.OPENAI_API_KEY, voice="alloy")
-vad = silero.VAD.load()
-db_helper = SupabaseHelper()
+# --- Global services, created on first use ---
+_models: dict | None = None
+# job id -> exit_session tasks started by session close, awaited before the job shuts down
+_exit_tasks: dict[str, set[asyncio.Task]] = {}
+
+
+def get_models() -> dict:
+    """The voice pipeline models shared by every session in the process: llm, stt, tts and vad."""
+    global _models
+    if _models is None:
+        with startup_profiler.step("voice clients"):
+            models = {
+                "llm": OpenAI_LLM(api_key=config.OPENAI_API_KEY),
+                "stt": Deepgram_STT(api_key=config.DEEPGRAM_API_KEY),
+                "tts": OpenAI_TTS(api_key=config.OPENAI_API_KEY, voice="alloy"),
+            }
+        with startup_profiler.step("silero VAD load"):
+            models["vad"] = silero.VAD.load()
+        _models = models
+    return _models
+
+
+def prewarm(proc: JobProcess):
+    """
+    Runs in every job process before it is offered a job: imports the agent graph, loads the
+    VAD and the tiktoken encoding and creates the clients, so a session never pays for them on join.
+    """
+    started = time.perf_counter()
+    if proc.executor_type == JobExecutorType.PROCESS:
+        worker_monitor.role = "job"
+    import agents.conversation_starter_agent, agents.user_agent, agents.user_interests_agent  # noqa: F401
+    get_db()
+    load_encoding()
+    get_embedding_cache().open(config.EMBEDDING_MODEL)
+    proc.userdata["models"] = get_models()
+    logger.info(
+        "Process %d prewarmed in %.0fms, rss %.0fMB",
+        os.getpid(), (time.perf_counter() - started) * 1000, worker_monitor.memory_mb(),
+    )
+
+
+worker_monitor.watch_queue("archive_queue", lambda: archive_queue.depth)
+worker_monitor.watch_queue("embeddings", lambda: get_embedding_service().depth)
+# One SQLite spool per host, so every process reports the same depth
+worker_monitor.watch_queue("job_spool", job_spool.depth, shared=True)
 
 
 async def handle_participant(ctx: JobContext, participant: rtc.RemoteParticipant):
-    logger.info(f"Handling participant: {participant.identity}")
+    logger.info("Handling participant: %s", participant.identity)
     try:
         metadata = json.loads(participant.metadata or "{}")
-        logger.debug(f"Parsed metadata: {metadata}")
+        logger.debug("Parsed metadata: %s", metadata)
     except json.JSONDecodeError:
-        logger.exception(f"Failed to parse metadata for participant {participant.identity}")
+        logger.exception("Failed to parse metadata for participant %s", participant.identity)
         metadata = {}
 
+    # The agent graph is only imported once there is a session to run
+    from agents.conversation_starter_agent import ConversationStarterAgent
+    from agents.user_agent import UserAgent
+    from agents.user_interests_agent import InterestTracker
+
     device_id = participant.identity
-    logger.info(f"Fetching user data for device_id: {device_id}")
-    await archive_nth_last_session(db=db_helper, child_id=device_id, n=11)
-    try:
-        child_profile = await db_helper.fetch_child_profile(device_id) or {}
-        personality = await db_helper.fetch_toy_personality(device_id) or {}
-        parental_instructions = await db_helper.fetch_parental_rules(device_id) or {}
-        last_sessions = await db_helper.get_last_n_conversations(device_id, 5) or []
-        ctx_summaries = await summarize_last_sessions(last_sessions) or []
-        preferences = await db_helper.get_interests(device_id) or {}
-    except Exception:
-        logger.exception("Failed to fetch data from Supabase. Using empty defaults.")
-        child_profile = {}
-        personality = personalities["cheerful_friend"]
-        parental_instructions = {}
-        last_sessions = []
-        ctx_summaries = []
-        preferences = {}
+    bind_session(device_id)
+    db_helper = get_db()
+    logger.info("Fetching user data for device_id: %s", device_id)
+    archive_queue.enqueue(db_helper, device_id)
+    pending = take_prefetch(ctx.job.id, device_id) or start_bootstrap(db_helper, device_id)
+    bootstrap = await pending.collect()
+    child_profile = bootstrap.child_profile
+    personality = bootstrap.personality
+    parental_instructions = bootstrap.parental_instructions
+    ctx_summaries = bootstrap.ctx_summaries
+    preferences = bootstrap.preferences
 
     # Ensure stable defaults for prompt filling
     user_name = child_profile.get("name", "friend")
@@ -70,7 +131,6 @@ async def handle_participant(ctx: JobContext, participant: rtc.RemoteParticipant
     city = child_profile.get("city", None)
     interests = child_profile.get("interests", []) or []
     dob = child_profile.get("birthday", None)
-    chat_history=[]
     try:
         current_personality = personalities["cheerful_friend"]
         safe_personality = {
@@ -81,7 +141,7 @@ async def handle_participant(ctx: JobContext, participant: rtc.RemoteParticipant
             "role_identity": current_personality.role_identity,
         }
     except KeyError:
-        logger.error(f"Could not find {personality} personality. Using a default personality.")
+        logger.error("Could not find %s personality. Using a default personality.", personality)
         safe_personality = {"energy": 0.5, "humor": 0.5, "curiosity": 0.5, "empathy": 0.5, "role_identity": "Best Friend"}
     except AttributeError:
         logger.error("The personality object does not have the expected attributes. Using defaults.")
@@ -100,41 +160,97 @@ async def handle_participant(ctx: JobContext, participant: rtc.RemoteParticipant
         city=city,
         interests=interests,
         dob=dob,
-        chat_history=chat_history
+        transcript=TranscriptWriter(db_helper, device_id),
+        interest_tracker=InterestTracker(device_id),
     )
 
-    logger.info(f"SessionData successfully constructed. is_new_user: {session_data.is_new_user}")
-    logger.debug(f"Full SessionData object: {session_data}")
+    logger.info("SessionData successfully constructed. is_new_user: %s", session_data.is_new_user)
 
     # ---- Build session ----
     logger.info("Initializing AgentSession...")
+    models = ctx.proc.userdata.get("models") or get_models()
     session = AgentSession[SessionData](
         userdata=session_data,
-        llm=llm,
-        stt=stt,
-        vad=vad,        
-        tts=tts,
+        llm=models["llm"],
+        stt=models["stt"],
+        vad=models["vad"],
+        tts=models["tts"],
     )
 
-    logger.info(f"Session : {session}")
+    worker_monitor.track_session(session)
+    # Keeps the child's vector index loaded until this session closes
+    claim_index(device_id)
+
+    @session.on("metrics_collected")
+    def _on_metrics_collected(event):
+        observe_pipeline(event.metrics)
+
+    @session.on("close")
+    def _on_session_close(_event):
+        release_index(device_id)
+        # Spool the post-session work even if the exit tool was never called
+        _exit_tasks.setdefault(ctx.job.id, set()).add(asyncio.create_task(exit_session(session_data)))
 
     # ---- Choose initial agent ----
     if session_data.is_new_user:
         logger.info("New user detected. Starting with UserAgent.")
-        active_agent = UserAgent(room=ctx.room, session_data=session_data)
+        active_agent = UserAgent(room=ctx.room, session_data=session_data, db=db_helper)
     else:
         logger.info("Existing user detected. Starting with ConversationStarterAgent.")
         active_agent = ConversationStarterAgent(room=ctx.room, session_data=session_data)
     
     await session.start(room=ctx.room, agent=active_agent)
 
+def _expected_device_id(job) -> str | None:
+    """Best guess at the device a job will serve, from dispatch metadata, room metadata or room name."""
+    for raw in (job.metadata, job.room.metadata):
+        try:
+            metadata = json.loads(raw or "{}")
+        except json.JSONDecodeError:
+            continue
+        if isinstance(metadata, dict):
+            device_id = metadata.get("device_id") or metadata.get("deviceId")
+            if device_id:
+                return device_id
+    prefix = config.PREFETCH_ROOM_PREFIX
+    if prefix and job.room.name.startswith(prefix) and len(job.room.name) > len(prefix):
+        return job.room.name[len(prefix):]
+    return None
+
+
 async def create_agent(ctx: JobContext):
-    logger.info(f"Starting agent for job {ctx.job.id}")
+    logger.info("Starting agent for job %s", ctx.job.id)
+
+    # Warm the session context while we connect to the room
+    expected_device_id = _expected_device_id(ctx.job)
+    if expected_device_id:
+        start_prefetch(ctx.job.id, get_db(), expected_device_id)
+
+    # Also picks up post-session work left on disk by an earlier process
+    job_spool.start()
+    # The monitor is per process: a job owns it only in its own child process, otherwise
+    # it belongs to the worker (started with the HTTP server) and outlives every job
+    owns_monitor = ctx.proc.executor_type == JobExecutorType.PROCESS
+    if owns_monitor:
+        worker_monitor.start()
 
     shutdown_event = asyncio.Event()
 
     async def on_shutdown(reason: str):
-        logger.info(f"Job is shutting down: {reason}")
+        logger.info("Job is shutting down: %s", reason)
+        cancel_prefetch(ctx.job.id)
+        # The transcript has to be spooled before the spool is drained
+        exit_tasks = _exit_tasks.pop(ctx.job.id, set())
+        if exit_tasks:
+            await asyncio.gather(*exit_tasks, return_exceptions=True)
+        await close_all_writers()
+        await asyncio.gather(
+            archive_queue.drain(timeout=5),
+            job_spool.drain(timeout=config.SPOOL_DRAIN_TIMEOUT),
+        )
+        logger.info("Job %s done, process %d rss %.0fMB", ctx.job.id, os.getpid(), worker_monitor.memory_mb())
+        if owns_monitor:
+            worker_monitor.shutdown()
         shutdown_event.set()
     
     ctx.add_participant_entrypoint(handle_participant)
@@ -150,21 +266,38 @@ async def health_check(_request):
     return web.Response(text="OK")
 
 
+async def metrics_handler(_request):
+    body, content_type = await asyncio.to_thread(render_metrics)
+    # web.Response rejects a charset in content_type=, so the header is set as is
+    return web.Response(body=body, headers={"Content-Type": content_type})
+
+
 async def run_http_server():
     app = web.Application()
     app.router.add_get("/", health_check)
+    app.router.add_get("/metrics", metrics_handler)
     runner = web.AppRunner(app)
     await runner.setup()
     port = int(os.environ.get("PORT", 7272))
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
-    logger.info(f"HTTP server running on port {port}")
+    worker_monitor.start()
+    logger.info("HTTP server running on port %s", port)
 
 
 # --- Main ---
 async def run_livekit_worker():
     options = WorkerOptions(
         entrypoint_fnc=create_agent,
+        prewarm_fnc=prewarm,
+        job_executor_type=JobExecutorType(config.JOB_EXECUTOR),
+        num_idle_processes=config.WORKER_IDLE_PROCESSES,
+        initialize_process_timeout=config.PROCESS_PREWARM_TIMEOUT,
+        job_memory_warn_mb=config.JOB_MEMORY_WARN_MB,
+        job_memory_limit_mb=config.JOB_MEMORY_LIMIT_MB,
+        request_fnc=worker_load.request_fnc,
+        load_fnc=worker_load,
+        load_threshold=config.LOAD_THRESHOLD,
         ws_url=config.LIVEKIT_URL,
         api_key=config.LIVEKIT_API_KEY,
         api_secret=config.LIVEKIT_API_SECRET,
@@ -177,5 +310,21 @@ async def main():
     await asyncio.gather(run_livekit_worker(), run_http_server())
 
 
+def profile_startup():
+    """Creates what the first session needs, then prints per-module import and per-step init times."""
+    with startup_profiler.step("import agents"):
+        import agents.conversation_starter_agent, agents.user_agent, agents.user_interests_agent  # noqa: F401
+    with startup_profiler.step("supabase client"):
+        get_db()
+    with startup_profiler.step("tiktoken encoding"):
+        load_encoding()
+    get_models()
+    startup_profiler.uninstall()
+    print(startup_profiler.report())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if PROFILE_STARTUP:
+        profile_startup()
+    else:
+        asyncio.run(main())
@@ -1,3 +1,5 @@
+from prompts.token_budget import PromptSection, assemble_prompt
+
 BASE_PROMPT="""You are NIJO — a yellow space explorer disguised as a cuddly toy cat, crash-landed on Earth from a distant galaxy.
 
 You once belonged to a crew of 7 colorful space adventurers on a stardust treasure mission. But something went wrong — one of the team betrayed the others, and your ship crash-landed on Earth. Now, your crewmates are asleep in their pods… and only YOU are awake.
@@ -130,55 +132,32 @@ Chat history:
 PARENTAL_PREFERENCE_AGENT_PROMPT = """
 You are a mature, respectful, and helpful AI assistant designed for a child's parent.
 You are NIJO in Parental Mode, assisting a parent to manage settings for their child.
-The device_id is {device_id}.
+The child's device_id is given under Session Context below; use it for every tool call.
 Available tools:
 
-- set_parental_rules: Update multiple rules in one call (e.g., {{'device_id': '{device_id}', 'rules': {{'bedtime': '8:00 PM', 'restricted_topics': ['violence', 'politics']}}}})
-- set_bedtime: Set bedtime, convert the time to HH:MM AM/PM format if not in required format (string, e.g., {{'device_id': '{device_id}', 'time': '8:00 PM'}})
-- set_language_filter: Enable/disable language filter (boolean, e.g., {{'device_id': '{device_id}', 'value': true}})
-- set_bedtime_reminder: Enable/disable bedtime reminder (boolean, e.g., {{'device_id': '{device_id}', 'value': true}})
-- set_restricted_topics: Set restricted conversation topics (array of strings, e.g., {{'device_id': '{device_id}', 'value': ['violence', 'politics']}})
-- set_tts_pitch_preference: Set text-to-speech pitch (string, e.g., {{'device_id': '{device_id}', 'value': 'low'}})
-- set_learning_focus: Set educational topics (array of strings, e.g., {{'device_id': '{device_id}', 'value': ['math', 'science']}})
-- set_alert_on_restricted: Enable/disable alerts for restricted topics (boolean, e.g., {{'device_id': '{device_id}', 'value': true}})
+- set_parental_rules: Update multiple rules in one call (e.g., {'device_id': '<device_id>', 'rules': {'bedtime': '8:00 PM', 'restricted_topics': ['violence', 'politics']}})
+- set_bedtime: Set bedtime, convert the time to HH:MM AM/PM format if not in required format (string, e.g., {'device_id': '<device_id>', 'time': '8:00 PM'})
+- set_language_filter: Enable/disable language filter (boolean, e.g., {'device_id': '<device_id>', 'value': true})
+- set_bedtime_reminder: Enable/disable bedtime reminder (boolean, e.g., {'device_id': '<device_id>', 'value': true})
+- set_restricted_topics: Set restricted conversation topics (array of strings, e.g., {'device_id': '<device_id>', 'value': ['violence', 'politics']})
+- set_tts_pitch_preference: Set text-to-speech pitch (string, e.g., {'device_id': '<device_id>', 'value': 'low'})
+- set_learning_focus: Set educational topics (array of strings, e.g., {'device_id': '<device_id>', 'value': ['math', 'science']})
+- set_alert_on_restricted: Enable/disable alerts for restricted topics (boolean, e.g., {'device_id': '<device_id>', 'value': true})
 
-Respond to the parent's request by calling the appropriate tool or providing guidance. For example, if the parent says 'set bedtime to 8:00 PM and restrict violence', call set_parental_rules with {{'device_id': '{device_id}', 'rules': {{'bedtime': '8:00 PM', 'restricted_topics': ['violence']}}}}. If the parent says 'exit parent mode' or 'child mode', switch back to child mode.
+Respond to the parent's request by calling the appropriate tool or providing guidance. For example, if the parent says 'set bedtime to 8:00 PM and restrict violence', call set_parental_rules with {'device_id': '<device_id>', 'rules': {'bedtime': '8:00 PM', 'restricted_topics': ['violence']}}. If the parent says 'exit parent mode' or 'child mode', switch back to child mode.
 - Use the `set_parental_rules` tool when multiple rules are specified, or `set_bedtime` for single bedtime updates.
 - In case you are unable to update the data, do not expose user to internal details, retry only once and explain that you were unable to complete the request, and inform them they can exit by saying 'exit parent mode'.
 - Be professional, friendly, and reassuring.
-
-Previous conversations with the child:
-{conversation_logs}
-
-Child’s profile:
-{child_profile}
 """
 
 CONVERSATION_STARTER_AGENT_PROMPT = BASE_PROMPT + """
 You are a friendly and engaging AI toy with a unique personality. Your goal is to start a fun conversation with a child. Your goal is to make child curious about science, history, geography and everthing. Make them a stronger person.
 
 Priority Information Usage:
-1. Always check the provided dynamic information below (ctx) for relevant details before answering.
+1. Always check the dynamic information in the Child Context below (ctx) for relevant details before answering.
 2. If needed information is missing, then use vector memory (`vector_chat_data`) to find it.
 3. If both are missing, ask the child directly in a friendly way.
-4. While answering, reply based on user's age {age}, for example if they are 10, answer question according to a 10 year old understanding.
-
-Dynamic Information (ctx):
-- Child's Name: {user_name}
-- Child's Age: {age}
-- Child's Interests: {interests}
-- Parental Rules: {parental_instructions}
-
-Your Personality DNA:
-- Role: {role_identity}
-- Energy Level: {energy_level}
-- Humor Style: {humor_style}
-- Curiosity: {curiosity_level}
-- Empathy: {empathy_style}
-
-
-Additional Memory Source:
-- Recent Conversation Memories (vector_chat_data): {vector_chat_data}
+4. While answering, reply based on the child's age, for example if they are 10, answer question according to a 10 year old understanding.
 
 Instructions:
 - Greet the child warmly using their name.
@@ -225,10 +204,59 @@ Instructions:
 """
 
 
+# Persona text shared by every child, so the prompt prefix stays byte-identical across sessions
+ASSISTANT_PROMPT = """
+You are NIJO, you can be a companion or a mentor to a young kid, you can answer all questions, spike thier curiosity on history, geography, science, general knowledge etc. Bascially making them a critical thinker. You can hear and have a brain."""
+
+# trait -> (label, text above 0.5, text at or below 0.5)
+PERSONALITY_TRAITS = {
+    "energy": ("Energy Level", "Hyperactive", "Calm"),
+    "humor": ("Humor Style", "Smart-witty", "Silly"),
+    "curiosity": ("Curiosity", "Endlessly curious", "Passive"),
+    "empathy": ("Empathy", "Proactive", "Reactive"),
+}
+
+# (trait, is_high) -> prompt line, formatted once per process
+PERSONALITY_FRAGMENTS = {
+    (trait, is_high): f"- {label}: {high if is_high else low}"
+    for trait, (label, high, low) in PERSONALITY_TRAITS.items()
+    for is_high in (True, False)
+}
+
+
+def personality_section(personality: dict) -> str:
+    lines = [f"- Role: {personality.get('role_identity', 'Best Friend')}"]
+    lines += [PERSONALITY_FRAGMENTS[(trait, personality.get(trait, 0.5) > 0.5)] for trait in PERSONALITY_TRAITS]
+    return "Your Personality DNA:\n" + "\n".join(lines)
+
+
+def _memoized(session_data, name: str, build, *inputs) -> str:
+    """
+    Builds a per-child prompt section once per session. Sections are keyed by their
+    inputs, so a section is rebuilt only if the session data it reads has changed.
+    """
+    key = (name, repr(inputs))
+    sections = session_data.prompt_sections
+    if key not in sections:
+        sections[key] = build(*inputs)
+    return sections[key]
+
+
+def _memory_items(memories) -> list[str]:
+    # Most recent first, so the oldest memories are the first to be dropped
+    if not memories:
+        return []
+    if not isinstance(memories, list):
+        memories = [memories]
+    return [f"- {memory}" for memory in memories]
+
+
 def create_assistant_prompt(child_profile=None, personality=None, parental_rules=None, chat_history=None):
     """
     Dynamically and safely creates the system prompt for the main assistant agent.
     It adapts to whichever arguments are provided and has a generic fallback.
+    The static persona always comes first; everything specific to the child follows it,
+    fitted into PROMPT_TOKEN_BUDGET with past conversations the first to be cut.
     """
     # If no specific data is provided at all, return a simple, friendly prompt.
     if not any([child_profile, personality, parental_rules, chat_history]):
@@ -240,27 +268,22 @@ def create_assistant_prompt(child_profile=None, personality=None, parental_rules
     parental_rules = parental_rules or {}
 
     # Build the prompt in parts, only adding sections if the data exists.
-    prompt_parts = []
+    sections = [PromptSection("persona", ASSISTANT_PROMPT, required=True)]
 
-    # --- Part 1: Basic Persona ---
+    # --- Part 1: The child ---
     # This part is always included but adapts if the name is missing.
-    base_prompt = f"""
-    You are NIJO, you can be a companion or a mentor to a young kid, you can answer all questions, spike thier curiosity on history, geography, science, general knowledge etc. Bascially making them a critical thinker. You can hear and have a brain. Your user is a child named {child_profile.get('name', 'a child')} age {child_profile.get('age', '10')}."""
-    prompt_parts.append(base_prompt)
+    sections.append(PromptSection(
+        "child",
+        f"Your user is a child named {child_profile.get('name', 'a child')} age {child_profile.get('age', '10')}.",
+        required=True,
+    ))
 
     # --- Part 2: Personality DNA ---
     if personality:
-        personality_prompt = f"""
-            Your current personality:
-            - Energy Level: {'Hyperactive' if personality.get('energy', 0.5) > 0.5 else 'Calm'}
-            - Humor Style: {'Smart-witty' if personality.get('humor', 0.5) > 0.5 else 'Silly'}
-            - Curiosity: {'Endlessly curious' if personality.get('curiosity', 0.5) > 0.5 else 'Passive'}
-            - Empathy: {'Proactive' if personality.get('empathy', 0.5) > 0.5 else 'Reactive'}
-            - Role: {personality.get('role_identity', 'Best Friend')}
-            """
-        prompt_parts.append(personality_prompt)
+        sections.append(PromptSection("personality", personality_section(personality), priority=1))
 
     # --- Part 3: Parental Rules ---
+    # Never cut: these are the rules the toy must follow
     if parental_rules:
         rules_prompt = f"""
             Parental Rules (Strictly Follow):
@@ -268,26 +291,99 @@ def create_assistant_prompt(child_profile=None, personality=None, parental_rules
             - Restricted Topics: {', '.join(parental_rules.get('restricted_topics', ['None']))}. Avoid these.
             - Use positive language and be a good role model.
             """
-        prompt_parts.append(rules_prompt)
+        sections.append(PromptSection("parental_rules", rules_prompt, required=True))
 
     # --- Part 4: Memory and Context ---
-    # Only add this section if we have some profile details or chat history.
-    if child_profile or chat_history:
-        memory_lines = []
-        if chat_history:
-            memory_lines.append(f"Here's what you remember from past conversations:\n{chat_history}")
-
-        # Use .get() for safe access to all keys to prevent errors.
-        if child_profile.get('interests'):
-            memory_lines.append(f"Engage with the child based on their interests: {', '.join(child_profile.get('interests', []))}.")
-        
-        if all(k in child_profile for k in ('name', 'age', 'city')):
-            memory_lines.append(
-                f"Remember to be a good friend to {child_profile.get('name')}, who is {child_profile.get('age')} years old and lives in {child_profile.get('city')}."
-            )
-        
-        if memory_lines:
-            prompt_parts.append("\n".join(memory_lines))
-
-    # Join all the available parts together into a single final prompt.
-    return "\n".join(prompt_parts)
\ No newline at end of file
+    # Use .get() for safe access to all keys to prevent errors.
+    if all(k in child_profile for k in ('name', 'age', 'city')):
+        sections.append(PromptSection(
+            "profile",
+            f"Remember to be a good friend to {child_profile.get('name')}, who is {child_profile.get('age')} years old and lives in {child_profile.get('city')}.",
+            priority=1,
+        ))
+
+    if child_profile.get('interests'):
+        sections.append(PromptSection(
+            "interests",
+            "Engage with the child based on their interests: ",
+            priority=2,
+            items=list(child_profile.get('interests', [])),
+            joiner=", ",
+        ))
+
+    if chat_history:
+        sections.append(PromptSection(
+            "memories",
+            "Here's what you remember from past conversations:\n",
+            priority=3,
+            items=_memory_items(chat_history),
+        ))
+
+    return assemble_prompt("assistant", sections)
+
+
+def _starter_prompt(user_name, age, interests, parental_instructions, personality, vector_chat_data) -> str:
+    return assemble_prompt("starter", [
+        PromptSection("instructions", CONVERSATION_STARTER_AGENT_PROMPT, required=True),
+        PromptSection(
+            "child",
+            f"""Child Context (ctx):
+- Child's Name: {user_name}
+- Child's Age: {age}
+- Parental Rules: {parental_instructions}""",
+            required=True,
+        ),
+        PromptSection("interests", "- Child's Interests: ", priority=2, items=[str(i) for i in interests], joiner=", "),
+        PromptSection("personality", "\n" + personality_section(personality), priority=1),
+        PromptSection(
+            "memories",
+            "\nAdditional Memory Source:\n- Recent Conversation Memories (vector_chat_data):\n",
+            priority=3,
+            items=_memory_items(vector_chat_data),
+        ),
+    ])
+
+
+def _parental_prompt(device_id, conversation_logs, child_profile) -> str:
+    return assemble_prompt("parental", [
+        PromptSection("instructions", PARENTAL_PREFERENCE_AGENT_PROMPT, required=True),
+        PromptSection("session", f"Session Context:\n- device_id: {device_id}", required=True),
+        PromptSection("child_profile", f"\nChild’s profile:\n{child_profile}", priority=1),
+        PromptSection(
+            "conversations",
+            "\nPrevious conversations with the child:\n",
+            priority=2,
+            items=_memory_items(conversation_logs),
+        ),
+    ])
+
+
+def compile_starter_prompt(session_data) -> str:
+    return _memoized(
+        session_data, "starter", _starter_prompt,
+        session_data.user_name or "friend",
+        session_data.age or "",
+        session_data.interests or [],
+        session_data.parental_instructions or {},
+        session_data.personality or {},
+        session_data.last_messages or [],
+    )
+
+
+def compile_assistant_prompt(session_data) -> str:
+    return _memoized(
+        session_data, "assistant", create_assistant_prompt,
+        session_data.child_profile,
+        session_data.personality,
+        session_data.parental_instructions,
+        session_data.last_messages,
+    )
+
+
+def compile_parental_prompt(session_data) -> str:
+    return _memoized(
+        session_data, "parental", _parental_prompt,
+        session_data.device_id,
+        session_data.last_messages,
+        session_data.child_profile,
+    )
@@ -0,0 +1,119 @@
+import functools
+import logging
+from dataclasses import dataclass
+
+import tiktoken
+
+import config
+from tools.worker_metrics import PROMPT_SECTION_TOKENS, PROMPT_SECTIONS
+
+logger = logging.getLogger("livekit.prompt_budget")
+
+# Cut text ends with this marker; sections with less room than MIN_SECTION_TOKENS are dropped
+ELLIPSIS = "…"
+MIN_SECTION_TOKENS = 16
+
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    # Lower priorities get their share of the budget first; required sections are always kept whole
+    priority: int = 0
+    required: bool = False
+    # List sections: `text` is the header, items are appended with `joiner` and dropped from the end
+    items: list[str] | None = None
+    joiner: str = "\n"
+
+
+# Rough size of a token when the tiktoken encoding cannot be loaded
+CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> tiktoken.Encoding | None:
+    try:
+        return tiktoken.get_encoding(config.PROMPT_TOKEN_ENCODING)
+    except Exception as e:
+        # The encoding file is downloaded on first use; never fail a prompt over it
+        logger.warning("tiktoken encoding %s unavailable, estimating tokens: %r", config.PROMPT_TOKEN_ENCODING, e)
+        return None
+
+
+def load_encoding():
+    """Loads (and on a cold cache downloads) the encoding up front, so the first prompt build does not block the event loop on it."""
+    _encoding()
+
+
+@functools.lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    # Cached, so the static prompt prefixes are only ever encoded once
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[:(max_tokens - 1) * CHARS_PER_TOKEN] + ELLIPSIS
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens - 1]) + ELLIPSIS
+
+
+def _fit(section: PromptSection, remaining: int) -> tuple[str | None, str]:
+    """Returns the section's text within `remaining` tokens (None to drop it) and whether it was kept, cut or dropped."""
+    if section.items is None:
+        if count_tokens(section.text) <= remaining:
+            return section.text, "kept"
+        if remaining < MIN_SECTION_TOKENS:
+            return None, "dropped"
+        return _truncate(section.text, remaining), "truncated"
+
+    if not section.items:
+        return None, "dropped"
+    used = count_tokens(section.text)
+    kept = []
+    for item in section.items:
+        cost = count_tokens(item) + (count_tokens(section.joiner) if kept else 0)
+        if used + cost > remaining:
+            break
+        kept.append(item)
+        used += cost
+    if not kept:
+        return None, "dropped"
+    return section.text + section.joiner.join(kept), "kept" if len(kept) == len(section.items) else "truncated"
+
+
+def assemble_prompt(name: str, sections: list[PromptSection], budget: int | None = None) -> str:
+    """
+    Joins `sections` in the given order, fitting them into `budget` tokens by priority.
+    Required sections are counted first; the rest are kept, cut down or dropped in
+    priority order, so low-priority memory is the first thing to go.
+    """
+    budget = config.PROMPT_TOKEN_BUDGET if budget is None else budget
+    remaining = budget - sum(count_tokens(s.text) for s in sections if s.required)
+
+    fitted: dict[str, tuple[str | None, str]] = {}
+    for section in sorted((s for s in sections if not s.required), key=lambda s: s.priority):
+        text, outcome = _fit(section, max(remaining, 0))
+        fitted[section.name] = (text, outcome)
+        if text is not None:
+            remaining -= count_tokens(text)
+
+    parts, report = [], []
+    for section in sections:
+        text, outcome = (section.text, "kept") if section.required else fitted[section.name]
+        tokens = count_tokens(text) if text is not None else 0
+        PROMPT_SECTION_TOKENS.labels(name, section.name).observe(tokens)
+        PROMPT_SECTIONS.labels(name, section.name, outcome).inc()
+        report.append(f"{section.name}={tokens}" + ("" if outcome == "kept" else f"/{outcome}"))
+        if text is not None:
+            parts.append(text)
+
+    prompt = "\n".join(parts)
+    logger.info("Prompt '%s' assembled to %s/%s tokens: %s", name, budget - remaining, budget, ', '.join(report))
+    return prompt
@@ -0,0 +1,70 @@
+-- Schema the voice agent relies on for conversation memory, transcripts and interests.
+-- Apply with `supabase db push` (or run in the SQL editor) before deploying the agent.
+
+-- Session summary written once when a session ends, read by the bootstrap
+alter table conversation_logs add column if not exists summary text;
+
+-- Overlapping turn-window chunks of each session transcript, embedded for memory lookups
+create table if not exists conversation_chunks (
+  id bigint generated by default as identity primary key,
+  session_id bigint not null references conversation_logs (id) on delete cascade,
+  child_id text not null,
+  turn_start integer not null,
+  turn_end integer not null,
+  content text not null,
+  embedding vector(1536),
+  created_at timestamptz not null default now()
+);
+create index if not exists conversation_chunks_child_id_idx on conversation_chunks (child_id);
+create index if not exists conversation_chunks_embedding_idx
+  on conversation_chunks using hnsw (embedding vector_cosine_ops);
+
+-- Same contract as match_conversations, over the chunks
+create or replace function match_conversation_chunks(
+  query_embedding vector(1536),
+  p_child_id text,
+  match_threshold float,
+  match_count int
+)
+returns table (id bigint, session_id bigint, content text, similarity float)
+language sql stable as $$
+  select c.id, c.session_id, c.content, 1 - (c.embedding <=> query_embedding) as similarity
+  from conversation_chunks as c
+  where c.child_id = p_child_id
+    and 1 - (c.embedding <=> query_embedding) > match_threshold
+  order by c.embedding <=> query_embedding
+  limit match_count;
+$$;
+
+-- Appends new turns to a session transcript server-side, so only the new turns are sent
+create or replace function append_conversation_turns(p_session_id bigint, p_turns jsonb)
+returns void language sql as $$
+  update conversation_logs
+  set content = coalesce(content, '[]'::jsonb) || p_turns
+  where id = p_session_id;
+$$;
+
+-- Number of turns a session transcript holds, without downloading it
+create or replace function conversation_turn_count(p_session_id bigint)
+returns integer language sql stable as $$
+  select coalesce(jsonb_array_length(content), 0)
+  from conversation_logs
+  where id = p_session_id;
+$$;
+
+-- Upserts one user_interests row per category, appending the items not already
+-- present (compared case-insensitively). p_interests maps category -> list of items,
+-- e.g. {"Hobbies": ["drawing"]}
+create unique index if not exists user_interests_user_category_key on user_interests (user_id, category);
+
+create or replace function merge_user_interests(p_user_id text, p_interests jsonb)
+returns void language sql as $$
+  insert into user_interests (user_id, category, items)
+  select p_user_id, c.key, array(select jsonb_array_elements_text(c.value))
+  from jsonb_each(p_interests) as c
+  on conflict (user_id, category) do update
+  set items = coalesce(user_interests.items, '{}') || array(
+    select i from unnest(excluded.items) as i
+    where lower(i) <> all (select lower(x) from unnest(coalesce(user_interests.items, '{}')) as x)
+  );
+$$;
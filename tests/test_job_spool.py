@@ -0,0 +1,54 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from tools.job_spool import JobSpool
+
+
+class FailingDB:
+    """Stands in for SupabaseHelper with every write failing, as during a Supabase outage."""
+
+    async def set_conversation_summary(self, conversation_id, summary: str):
+        raise ConnectionError("supabase unavailable")
+
+
+class JobSpoolRetryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "spool.db")
+        self.spool = JobSpool(self.path, workers=1, max_attempts=3, retry_backoff=60, lease=300)
+
+    async def asyncTearDown(self):
+        for worker in self.spool._workers:
+            worker.cancel()
+        await asyncio.gather(*self.spool._workers, return_exceptions=True)
+        self.spool._conn.close()
+        self.dir.cleanup()
+
+    async def test_failed_db_write_leaves_job_pending(self):
+        db = FailingDB()
+        calls = []
+
+        async def summarize(payload: dict, attempts: int):
+            calls.append(attempts)
+            await db.set_conversation_summary(payload["session_id"], "summary")
+
+        self.spool.register("summarize_session", summarize)
+        await self.spool.enqueue("summarize_session", {"session_id": 1})
+        await self.spool.drain(timeout=2)
+
+        with sqlite3.connect(self.path) as conn:
+            rows = conn.execute("SELECT attempts, dead, leased_until, last_error FROM jobs").fetchall()
+        self.assertEqual(calls, [0])
+        self.assertEqual(len(rows), 1)
+        attempts, dead, leased_until, last_error = rows[0]
+        self.assertEqual(attempts, 1)
+        self.assertEqual(dead, 0)
+        self.assertIsNone(leased_until)
+        self.assertIn("supabase unavailable", last_error)
+
+
+if __name__ == "__main__":
+    unittest.main()
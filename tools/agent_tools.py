@@ -1,55 +1,95 @@
 from livekit.agents import function_tool
 from livekit import rtc
-from .supabase_tools import SupabaseHelper
+from .supabase_tools import get_db
+from .summariser_tool import summarize_session
+from .embedding_service import get_embedding_service
+from .job_spool import job_spool
+from .openai_client import get_openai_client
+from .transcript_writer import TranscriptWriter
+from .tracing import traced
+from .worker_metrics import timed_call
 from agents.session_data import SessionData
-from agents.user_interests_agent import UserInterestAgent
-from openai import OpenAI
-from config import OPENAI_API_KEY
 import logging
 
-db = SupabaseHelper()
-agent = UserInterestAgent()
-client = OpenAI(api_key=OPENAI_API_KEY) 
-
 logger = logging.getLogger('livekit.router')
 
 async def exit_session(session_data: SessionData):
-	logger.info(f"Chat : {session_data.chat_history}")
-	await agent.process_message(user_id=session_data.device_id,message=session_data.chat_history)
-	
-	chat_history = session_data.chat_history
-
-	text_to_embed = " ".join([m['content'] for m in chat_history])
-	logger.info(f"Text to embed : {text_to_embed}")
-	response = client.embeddings.create(
-		input=[text_to_embed],
-		model="text-embedding-3-small"
-	)
-	embedding_vector = response.data[0].embedding
-	print(embedding_vector)
-
-	result = await db.log_conversation(child_id=session_data.device_id, content=session_data.chat_history, embedding=embedding_vector)
-	
-	return result
+	"""
+	Hands the post-session work to the job spool and returns at once.
+	Safe to call more than once; only the first call spools anything.
+	"""
+	if session_data.ended:
+		return
+	session_data.ended = True
+	logger.info("Session for %s ended after %s turns", session_data.device_id, len(session_data.chat_history))
+
+	# Recent turns plus the rolling summary of older ones, so the payload stays bounded
+	chat_history = session_data.chat_history.transcript()
+	# Turns and their chunk embeddings were persisted during the session; only the tail is left
+	transcript, session_data.transcript = session_data.transcript, None
+	if transcript is not None:
+		await job_spool.enqueue("finish_transcript", {"transcript": await transcript.detach(), "chat_history": chat_history})
+	tracker, session_data.interest_tracker = session_data.interest_tracker, None
+	if tracker is not None:
+		await job_spool.enqueue("store_interests", tracker.detach())
+
+
+async def _finish_transcript(payload: dict, attempts: int):
+	writer = TranscriptWriter.from_state(get_db(), payload["transcript"])
+	# Only a retry can find part of the tail already written
+	await writer.persist_tail(check_stored=attempts > 0)
+	if writer.session_id is None:
+		return []
+	# Spooled with this job's completion, so once the tail is written this job never runs again
+	follow_ups = [("chunk_transcript", {"transcript": writer.state()})]
+	if payload["chat_history"]:
+		follow_ups.append(("summarize_session", {"session_id": writer.session_id, "chat_history": payload["chat_history"]}))
+	return follow_ups
+
+
+async def _chunk_transcript(payload: dict, attempts: int):
+	await TranscriptWriter.from_state(get_db(), payload["transcript"]).finish_windows()
+
+
+async def _summarize_session(payload: dict, attempts: int):
+	summary = await summarize_session(payload["chat_history"])
+	if summary:
+		await get_db().set_conversation_summary(payload["session_id"], summary)
+
+
+async def _store_interests(payload: dict, attempts: int):
+	# Turns the tracker had not reached yet are extracted here, then the session's set is written once
+	interests = payload["interests"]
+	if payload["turns"]:
+		# Imported here so importing this module does not load the agent graph
+		from agents.user_interests_agent import get_interest_agent
+		detected = await get_interest_agent().detect_in_windows(payload["turns"])
+		interests = {category: interests.get(category, []) + items for category, items in detected.items()}
+	await get_db().merge_user_interests(payload["child_id"], interests)
+
+
+job_spool.register("finish_transcript", _finish_transcript)
+job_spool.register("chunk_transcript", _chunk_transcript)
+job_spool.register("summarize_session", _summarize_session)
+job_spool.register("store_interests", _store_interests)
 
+@traced("rag.get_data")
 async def get_data(message: str, session_data: SessionData):
-    print(f"message : {message}")
+    logger.debug("RAG query: %s", message)
 
-    response = client.embeddings.create(
-        input=[message],
-        model="text-embedding-3-small"
-    )
-    embedding = response.data[0].embedding
+    embedding = await get_embedding_service().embed(message)
 
-    result = await db.get_rag_context(child_id=session_data.device_id, embedding=embedding)
+    result = await get_db().get_rag_context(child_id=session_data.device_id, embedding=embedding)
 
     # Ensure it's a text string the LLM can read
     if isinstance(result, list):
         result = "\n".join([r["content"] for r in result if "content" in r])
     
-    print(f"result from RAG retrieval ::: {result}")
+    logger.debug("RAG result: %s", result)
     return result
 
+@traced("llm.generate_query_summary")
+@timed_call("openai", "generate_query_summary")
 async def generate_query_summary(chat_history: list) -> str:
     """
     Generates a concise query summary from chat history for RAG retrieval.
@@ -73,15 +113,15 @@ async def generate_query_summary(chat_history: list) -> str:
         messages.append({"role": msg['role'], "content": msg['content']})
 
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=messages,
             temperature=0.0
         )
         summary = response.choices[0].message.content.strip()
-        print(f"Synthesized query for RAG: {summary}")
+        logger.debug("Synthesized query for RAG: %s", summary)
         return summary
     except Exception as e:
-        print(f"Error generating query summary: {e}")
+        logger.error("Error generating query summary: %s", e)
         return chat_history[-1]['content']
 
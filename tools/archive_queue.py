@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+import config
+from tools.summariser_tool import archive_nth_last_session
+
+logger = logging.getLogger("livekit.archive_queue")
+
+
+class ArchiveQueue:
+    """
+    Per-process background queue that compacts old sessions off the join path.
+    Each child is queued at most once at a time; pending children are taken in
+    batches and archived with bounded concurrency. Batches only span several children
+    with JOB_EXECUTOR=thread; a single-use job process only ever queues its own child.
+    """
+
+    def __init__(self, batch_size: int, batch_window: float, max_concurrency: int):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # child_id -> (db, enqueued_at), oldest first
+        self._pending: OrderedDict[str, tuple[object, float]] = OrderedDict()
+        self._in_flight: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self.processed = 0
+        self.failed = 0
+        self.last_lag = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def lag(self) -> float:
+        """Seconds the oldest pending child has been waiting."""
+        if not self._pending:
+            return 0.0
+        _, enqueued_at = next(iter(self._pending.values()))
+        return time.monotonic() - enqueued_at
+
+    def metrics(self) -> dict:
+        return {
+            "depth": self.depth,
+            "in_flight": len(self._in_flight),
+            "lag_seconds": round(self.lag, 3),
+            "last_lag_seconds": round(self.last_lag, 3),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    def enqueue(self, db, child_id: str) -> bool:
+        """Schedules archival for a child. Returns False if it is already queued or running."""
+        if child_id in self._pending or child_id in self._in_flight:
+            return False
+        self._pending[child_id] = (db, time.monotonic())
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="archive_queue")
+        self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Give other joins a moment to land in the same batch
+            await asyncio.sleep(self.batch_window)
+            self._wakeup.clear()
+
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    child_id, (db, enqueued_at) = self._pending.popitem(last=False)
+                    self._in_flight.add(child_id)
+                    batch.append((child_id, db, enqueued_at))
+
+                await asyncio.gather(*(self._archive(*item) for item in batch))
+                logger.info("Archived batch of %s children, queue: %s", len(batch), self.metrics())
+
+    async def _archive(self, child_id: str, db, enqueued_at: float):
+        async with self._semaphore:
+            self.last_lag = time.monotonic() - enqueued_at
+            try:
+                await archive_nth_last_session(db=db, child_id=child_id, n=config.ARCHIVE_KEEP_SESSIONS)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Error archiving sessions for %s: %s", child_id, e)
+            finally:
+                self._in_flight.discard(child_id)
+
+    async def drain(self, timeout: float):
+        """Waits up to `timeout` seconds for queued and running work to finish."""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending or self._in_flight:
+            logger.warning("Archive queue not drained before shutdown: %s", self.metrics())
+
+
+archive_queue = ArchiveQueue(
+    batch_size=config.ARCHIVE_BATCH_SIZE,
+    batch_window=config.ARCHIVE_BATCH_WINDOW,
+    max_concurrency=config.ARCHIVE_MAX_CONCURRENCY,
+)
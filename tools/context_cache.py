@@ -0,0 +1,55 @@
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+import config
+
+logger = logging.getLogger("livekit.context_cache")
+
+MISSING = object()
+
+
+class ContextCache:
+    """
+    In-process cache of per-device session context (profile, personality, rules, interests).
+    Entries expire after `ttl` seconds and at most `max_devices` devices are kept (LRU).
+    Only JOB_EXECUTOR=thread runs a device's later sessions and reconnects in the same process;
+    under the process executor every job process is single-use, so entries die with the session.
+    """
+
+    def __init__(self, ttl: float, max_devices: int):
+        self.ttl = ttl
+        self.max_devices = max_devices
+        # device_id -> {field: (stored_at, value)}, least recently used first
+        self._entries: OrderedDict[str, dict[str, tuple[float, Any]]] = OrderedDict()
+
+    def get(self, device_id: str, field: str):
+        """Returns the cached value or MISSING."""
+        fields = self._entries.get(device_id)
+        cached = fields.get(field) if fields else None
+        if cached is None or time.monotonic() - cached[0] > self.ttl:
+            if cached is not None:
+                del fields[field]
+            return MISSING
+        self._entries.move_to_end(device_id)
+        return copy.deepcopy(cached[1])
+
+    def set(self, device_id: str, field: str, value: Any):
+        fields = self._entries.setdefault(device_id, {})
+        fields[field] = (time.monotonic(), copy.deepcopy(value))
+        self._entries.move_to_end(device_id)
+        while len(self._entries) > self.max_devices:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, device_id: str, field: str | None = None):
+        """Drops one field, or the whole device entry when no field is given."""
+        if field is None:
+            self._entries.pop(device_id, None)
+        elif device_id in self._entries:
+            self._entries[device_id].pop(field, None)
+        logger.debug("Invalidated cached context for %s: %s", device_id, field or 'all fields')
+
+
+context_cache = ContextCache(ttl=config.CONTEXT_CACHE_TTL, max_devices=config.CONTEXT_CACHE_MAX_DEVICES)
@@ -0,0 +1,213 @@
+import atexit
+import fcntl
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+import config
+from tools.worker_metrics import EMBED_CACHE_LOOKUPS
+
+logger = logging.getLogger("livekit.embedding_cache")
+
+KEY_BYTES = 32  # sha256 digest
+FLUSH_EVERY = 256  # writes between msyncs
+MAX_PROBES = 8  # slots searched from a key's home slot before one is overwritten
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+def _write_json_atomic(path: str, data: dict):
+    """Readers see either the old file or the new one, never a partial write."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _sized_file(path: str, size: int):
+    """Creates `path` zero-filled to `size` bytes if it is missing or short; never truncates data."""
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+
+
+class DiskEmbeddingStore:
+    """
+    Fixed-capacity on-disk tier: float16 vectors in a memory-mapped file next to a
+    memory-mapped array of their keys, laid out as an open-addressed hash table. A key
+    lives within MAX_PROBES slots of the slot its hash points at; when those are all taken
+    the home slot is overwritten. The files are shared by every worker process on the host
+    and looked up directly, so a vector one process writes is found by all the others.
+    Writes hold an exclusive flock on the store and reads a shared one, so a reader never
+    sees a half-written vector. Each dim/capacity pair gets its own directory, so a config
+    change never truncates files another process still has mapped.
+    """
+
+    def __init__(self, path: str, dim: int, capacity: int):
+        self.path = os.path.join(path, f"{dim}x{capacity}")
+        self.dim = dim
+        self.capacity = capacity
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_file = open(os.path.join(self.path, "lock"), "a")
+
+        with self._locked(fcntl.LOCK_EX):
+            vectors_path = os.path.join(self.path, "vectors.f16")
+            keys_path = os.path.join(self.path, "keys.bin")
+            _sized_file(vectors_path, capacity * dim * 2)
+            _sized_file(keys_path, capacity * KEY_BYTES)
+            self.vectors = np.memmap(vectors_path, dtype=np.float16, mode="r+", shape=(capacity, dim))
+            self.keys = np.memmap(keys_path, dtype=np.uint8, mode="r+", shape=(capacity, KEY_BYTES))
+        self._unflushed = 0
+
+    @contextmanager
+    def _locked(self, mode: int):
+        fcntl.flock(self._lock_file, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _probe(self, key: bytes) -> tuple[int | None, int | None]:
+        """The slot holding `key` and the first empty slot on its probe path; either may be None."""
+        home = int.from_bytes(key[:8], "little") % self.capacity
+        for i in range(min(MAX_PROBES, self.capacity)):
+            slot = (home + i) % self.capacity
+            stored = self.keys[slot]
+            if stored.tobytes() == key:
+                return slot, None
+            if not stored.any():
+                # Slots are never emptied, so the key cannot sit further along
+                return None, slot
+        return None, None
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        with self._locked(fcntl.LOCK_SH):
+            slot, _ = self._probe(key)
+            if slot is None:
+                return None
+            return np.array(self.vectors[slot], dtype=np.float32)
+
+    def put(self, key: bytes, vector):
+        with self._locked(fcntl.LOCK_EX):
+            slot, empty = self._probe(key)
+            if slot is not None:
+                return
+            if empty is None:
+                empty = int.from_bytes(key[:8], "little") % self.capacity
+            self.vectors[empty] = np.asarray(vector, dtype=np.float16)
+            self.keys[empty] = np.frombuffer(key, dtype=np.uint8)
+        self._unflushed += 1
+        if self._unflushed >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.vectors.flush()
+        self.keys.flush()
+        self._unflushed = 0
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by model + normalized text.
+    An in-memory LRU sits in front of an optional per-model DiskEmbeddingStore.
+    """
+
+    def __init__(self, max_memory_entries: int, disk_dir: str | None, disk_capacity: int):
+        self.max_memory_entries = max_memory_entries
+        self.disk_dir = disk_dir
+        self.disk_capacity = disk_capacity
+        self._memory: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._disk: dict[str, DiskEmbeddingStore] = {}
+
+    def _store(self, model: str, dim: int | None = None) -> DiskEmbeddingStore | None:
+        if not self.disk_dir:
+            return None
+        store = self._disk.get(model)
+        if store is None:
+            path = os.path.join(self.disk_dir, model)
+            meta_path = os.path.join(path, "meta.json")
+            if dim is None:
+                # Lookups before this process has embedded anything find the dim another process recorded
+                try:
+                    with open(meta_path) as f:
+                        dim = int(json.load(f)["dim"])
+                except FileNotFoundError:
+                    return None
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning("Unreadable embedding cache meta for %s, skipping the disk tier: %r", model, e)
+                    return None
+            try:
+                store = DiskEmbeddingStore(path, dim, self.disk_capacity)
+                _write_json_atomic(meta_path, {"dim": dim})
+            except (OSError, ValueError) as e:
+                logger.error("Disabling on-disk embedding cache for %s: %s", model, e)
+                self.disk_dir = None
+                return None
+            self._disk[model] = store
+        return store
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        key = cache_key(model, text)
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            EMBED_CACHE_LOOKUPS.labels("memory").inc()
+            return vector.tolist()
+
+        store = self._store(model)
+        vector = store.get(key) if store is not None else None
+        if vector is not None:
+            self._remember(key, vector)
+            EMBED_CACHE_LOOKUPS.labels("disk").inc()
+            return vector.tolist()
+
+        EMBED_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    def put(self, model: str, text: str, vector: list[float]):
+        key = cache_key(model, text)
+        self._remember(key, np.asarray(vector, dtype=np.float32))
+        store = self._store(model, dim=len(vector))
+        if store is not None:
+            store.put(key, vector)
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        for store in self._disk.values():
+            store.flush()
+
+    def open(self, model: str):
+        """Maps the model's disk tier ahead of the first lookup, if another process already created it."""
+        self._store(model)
+
+
+_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache, created on first use and flushed at exit."""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(
+            max_memory_entries=config.EMBED_CACHE_MEMORY_ENTRIES,
+            disk_dir=config.EMBED_CACHE_DIR,
+            disk_capacity=config.EMBED_CACHE_DISK_ENTRIES,
+        )
+        atexit.register(_cache.flush)
+    return _cache
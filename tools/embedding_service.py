@@ -0,0 +1,160 @@
+import asyncio
+import logging
+
+from openai import AsyncOpenAI, BadRequestError
+
+import config
+from prompts.token_budget import count_tokens
+from tools.embedding_cache import get_embedding_cache
+from tools.tracing import traced
+from tools.worker_metrics import timed_call
+
+logger = logging.getLogger("livekit.embedding_service")
+
+
+class EmbeddingService:
+    """
+    Async embeddings for the sessions in this process. Requests that arrive within
+    `window` seconds of each other are sent as one batched embeddings call and the
+    vectors are routed back to their callers. Batches only mix sessions with
+    JOB_EXECUTOR=thread; in a single-use job process they batch one session's requests.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._client: AsyncOpenAI | None = None
+        # model -> [(text, future)] waiting for the next flush
+        self._pending: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._flushes: set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+
+    @property
+    def depth(self) -> int:
+        """Texts waiting for the next batched call."""
+        return sum(len(batch) for batch in list(self._pending.values()))
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+        return self._client
+
+    async def embed(self, text: str, model: str = config.EMBEDDING_MODEL, cache: bool = True) -> list[float]:
+        return (await self.embed_many([text], model=model, cache=cache))[0]
+
+    async def embed_many(self, texts: list[str], model: str = config.EMBEDDING_MODEL, cache: bool = True) -> list[list[float]]:
+        """
+        Embeds `texts` in order. With `cache`, short repeated queries are served from the
+        embedding cache; pass cache=False for one-off inputs such as whole transcripts.
+        """
+        if not texts:
+            return []
+        for text in texts:
+            self._check_input(text)
+        self.requests += len(texts)
+        if not cache:
+            return await self._submit(texts, model)
+
+        embedding_cache = get_embedding_cache()
+        vectors = [embedding_cache.get(model, text) for text in texts]
+        misses = [i for i, vector in enumerate(vectors) if vector is None]
+        if misses:
+            fetched = await self._submit([texts[i] for i in misses], model)
+            for i, vector in zip(misses, fetched):
+                embedding_cache.put(model, texts[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    @staticmethod
+    def _check_input(text: str):
+        """
+        Inputs the API would reject are refused here, before they join a batch shared with
+        other sessions, so they only fail their own caller.
+        """
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("Cannot embed empty text")
+        # A character is at most 4 tokens, so short texts skip the count
+        if len(text) * 4 > config.EMBED_MAX_INPUT_TOKENS and count_tokens(text) > config.EMBED_MAX_INPUT_TOKENS:
+            raise ValueError(f"Text of {len(text)} chars exceeds the {config.EMBED_MAX_INPUT_TOKENS} token embedding limit")
+
+    async def _submit(self, texts: list[str], model: str) -> list[list[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.setdefault(model, []).append((text, future))
+            futures.append(future)
+
+        if len(self._pending[model]) >= self.max_batch:
+            self._schedule_flush(model)
+        elif model not in self._timers:
+            self._timers[model] = loop.call_later(self.window, self._schedule_flush, model)
+
+        return list(await asyncio.gather(*futures))
+
+    def _schedule_flush(self, model: str):
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(model, [])
+        while pending:
+            batch, pending = pending[:self.max_batch], pending[self.max_batch:]
+            task = asyncio.create_task(self._flush(model, batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    @traced("llm.embeddings")
+    @timed_call("openai", "embeddings")
+    async def _flush(self, model: str, batch: list[tuple[str, asyncio.Future]], retried: bool = False):
+        # Identical texts in one window share a single input
+        inputs = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            response = await self.client.embeddings.create(input=inputs, model=model)
+            self.batches += 1
+            vectors = {inputs[item.index]: item.embedding for item in response.data}
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+        except BadRequestError as e:
+            if len(inputs) == 1:
+                logger.error("Embedding request rejected: %s", e)
+                self._fail(batch, e)
+                return
+            # One bad input must not fail every session in the window: retry each on its own
+            logger.warning("Embedding batch of %d inputs rejected, retrying them one by one: %s", len(inputs), e)
+            await asyncio.gather(*(
+                self._flush(model, [(text, future) for text_, future in batch if text_ == text], retried)
+                for text in inputs
+            ))
+        except Exception as e:
+            # Rate limits, timeouts and server errors hit every input alike: retry the batch once, later
+            if retried:
+                logger.error("Embedding batch of %d inputs failed: %s", len(inputs), e)
+                self._fail(batch, e)
+                return
+            logger.warning("Embedding batch of %d inputs failed, retrying in %.1fs: %s", len(inputs), config.EMBED_RETRY_BACKOFF, e)
+            await asyncio.sleep(config.EMBED_RETRY_BACKOFF)
+            await self._flush(model, batch, retried=True)
+
+    @staticmethod
+    def _fail(batch: list[tuple[str, asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+
+_service: EmbeddingService | None = None
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Process-wide embedding service, created on first use."""
+    global _service
+    if _service is None:
+        _service = EmbeddingService(
+            window=config.EMBED_BATCH_WINDOW_MS / 1000,
+            max_batch=config.EMBED_MAX_BATCH,
+        )
+    return _service
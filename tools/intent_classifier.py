@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+import config
+from tools.embedding_service import get_embedding_service
+from tools.worker_metrics import INTENT_CONFIDENCE, INTENT_DECISIONS, INTENT_SECONDS
+
+logger = logging.getLogger("livekit.intent_classifier")
+
+USER = "user"
+PARENTAL = "parental"
+CONVERSATION = "conversation"
+
+# Unambiguous phrasings, checked in order before anything else
+RULES = [
+    (PARENTAL, re.compile(
+        r"\b(parent(al)?\s+(mode|settings?|controls?)|set\s+(the\s+)?bed\s*time|bed\s*time\s+(to|at)\s+\d"
+        r"|screen\s*time\s+(limit|to)|(restrict|block)\s+(the\s+)?topics?)\b",
+        re.I,
+    )),
+    # Only explicit requests to edit the profile: "my name is Sam!" is ordinary chatter
+    (USER, re.compile(r"\b(change (my|the) (child'?s )?name|(update|edit|change) (my|the) (child'?s )?profile)\b", re.I)),
+]
+
+# Example utterances whose embeddings are averaged into one centroid per intent
+EXAMPLES = {
+    USER: [
+        "update my profile",
+        "change my name",
+        "I want to change my age",
+        "I moved to a new city",
+        "edit my child's profile",
+        "my birthday is in June",
+    ],
+    PARENTAL: [
+        "set bedtime to 8 pm",
+        "restrict violent topics",
+        "switch to parent mode",
+        "limit screen time to one hour",
+        "don't talk about scary things with my kid",
+        "manage my child's settings",
+    ],
+    CONVERSATION: [
+        "tell me about space",
+        "tell me a story",
+        "tell me a joke",
+        "why is the sky blue",
+        "let's play a game",
+        "what do dinosaurs eat",
+        "I drew a picture today",
+        "can you sing a song",
+    ],
+}
+
+
+@dataclass
+class IntentDecision:
+    # None when the local classifier is not confident and the LLM should decide
+    intent: str | None
+    confidence: float
+    source: str
+    latency: float
+
+
+class IntentClassifier:
+    """
+    Local fast path for routing a user turn. Keyword rules settle the obvious cases
+    outright; otherwise the turn's embedding is compared with one centroid per intent
+    and accepted only if it clears `min_similarity` by `margin` over the runner-up.
+    Everything else is left to the LLM router. Only RouterAgent consults it, and main does not
+    start sessions on a RouterAgent, so it is off the live path until an agent hands off to one.
+    """
+
+    def __init__(self, min_similarity: float, margin: float, embed_timeout: float):
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.embed_timeout = embed_timeout
+        self._intents = list(EXAMPLES)
+        self._centroids: asyncio.Task | None = None
+
+    async def _compute_centroids(self) -> np.ndarray:
+        texts = [text for intent in self._intents for text in EXAMPLES[intent]]
+        vectors = np.asarray(await get_embedding_service().embed_many(texts), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        centroids, start = [], 0
+        for intent in self._intents:
+            end = start + len(EXAMPLES[intent])
+            centroid = vectors[start:end].mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+            start = end
+        return np.vstack(centroids)
+
+    def _load_centroids(self) -> asyncio.Future:
+        # Computed once per process and shielded, so a turn timing out does not restart it
+        if self._centroids is None or (self._centroids.done() and (self._centroids.cancelled() or self._centroids.exception())):
+            self._centroids = asyncio.create_task(self._compute_centroids())
+        return asyncio.shield(self._centroids)
+
+    async def classify(self, text: str) -> IntentDecision:
+        started = time.perf_counter()
+        decision = await self._classify(text)
+        decision.latency = time.perf_counter() - started
+        self.record(decision.source, decision.intent, decision.latency, decision.confidence)
+        logger.debug(
+            "Intent %s via %s (confidence %.2f, %.0fms)",
+            decision.intent or "undecided", decision.source, decision.confidence, decision.latency * 1000,
+        )
+        return decision
+
+    async def _classify(self, text: str) -> IntentDecision:
+        if not text.strip():
+            return IntentDecision(None, 0.0, "fallback", 0.0)
+        for intent, pattern in RULES:
+            if pattern.search(text):
+                return IntentDecision(intent, 1.0, "rule", 0.0)
+
+        try:
+            centroids, embedding = await asyncio.wait_for(
+                asyncio.gather(self._load_centroids(), get_embedding_service().embed(text)),
+                timeout=self.embed_timeout,
+            )
+        except Exception as e:
+            logger.warning("Embedding intent match unavailable, deferring to LLM: %r", e)
+            return IntentDecision(None, 0.0, "error", 0.0)
+
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = centroids @ (query / np.linalg.norm(query))
+        ranked = np.argsort(-similarities)
+        best, runner_up = float(similarities[ranked[0]]), float(similarities[ranked[1]])
+        if best >= self.min_similarity and best - runner_up >= self.margin:
+            return IntentDecision(self._intents[ranked[0]], best, "centroid", 0.0)
+        return IntentDecision(None, best, "fallback", 0.0)
+
+    @staticmethod
+    def record(source: str, intent: str | None, latency: float, confidence: float):
+        """Exports one routing decision by source (rule, centroid, fallback, error, llm)."""
+        INTENT_DECISIONS.labels(source, intent or "undecided").inc()
+        INTENT_SECONDS.labels(source).observe(latency)
+        INTENT_CONFIDENCE.labels(source).observe(confidence)
+
+
+intent_classifier = IntentClassifier(
+    min_similarity=config.ROUTER_MIN_SIMILARITY,
+    margin=config.ROUTER_MARGIN,
+    embed_timeout=config.ROUTER_EMBED_TIMEOUT,
+)
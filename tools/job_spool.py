@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+import config
+
+logger = logging.getLogger("livekit.job_spool")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    leased_until REAL,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class JobSpool:
+    """
+    Durable local queue for post-session work, stored in SQLite so it survives
+    crashes and restarts. Async workers lease jobs, run the handler registered for
+    their kind, and retry failures with exponential backoff until `max_attempts`.
+    Handlers are called with the payload and the number of earlier failed attempts.
+    A handler may return follow-up jobs as (kind, payload) pairs; they are spooled in the
+    same transaction that completes the job, so a finished step is never run again.
+    Leases let several worker processes share one spool file.
+    """
+
+    def __init__(self, path: str, workers: int, max_attempts: int, retry_backoff: float, lease: float):
+        self.path = path
+        self.num_workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = lease
+        self._handlers: dict[str, Callable[[dict, int], Awaitable[Any]]] = {}
+        self._conn: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        self._running = 0
+
+    def register(self, kind: str, handler: Callable[[dict, int], Awaitable[Any]]):
+        self._handlers[kind] = handler
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(SCHEMA)
+        return self._conn
+
+    async def _run_db(self, fn, *args):
+        def locked():
+            with self._db_lock:
+                return fn(self._db(), *args)
+        return await asyncio.to_thread(locked)
+
+    async def enqueue(self, kind: str, payload: dict):
+        """Durably records a job, then wakes a worker to run it."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+
+        await self._run_db(self._insert, kind, payload)
+        self.start()
+        self._wakeup.set()
+
+    def _insert(self, conn, kind: str, payload: dict):
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (kind, payload, run_after, created_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload), now, now),
+        )
+
+    def start(self):
+        """Starts the worker tasks on the running loop if they are not already running."""
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.num_workers:
+            self._workers.append(asyncio.create_task(self._worker(), name=f"job_spool_{len(self._workers)}"))
+
+    def _claim(self, conn):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs"
+                " WHERE dead = 0 AND run_after <= ? AND (leased_until IS NULL OR leased_until < ?)"
+                " ORDER BY id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET leased_until = ? WHERE id = ?", (now + self.lease, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _complete(self, conn, job_id: int, follow_ups: list[tuple[str, dict]]):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            for kind, payload in follow_ups:
+                self._insert(conn, kind, payload)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _fail(self, conn, job_id: int, attempts: int, error: str):
+        dead = attempts >= self.max_attempts
+        conn.execute(
+            "UPDATE jobs SET attempts = ?, run_after = ?, leased_until = NULL, dead = ?, last_error = ? WHERE id = ?",
+            (attempts, time.time() + self.retry_backoff * 2 ** (attempts - 1), int(dead), error, job_id),
+        )
+        return dead
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._run_db(self._claim)
+            except Exception as e:
+                logger.error("Error claiming spooled job: %s", e)
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # Poll as well, for retries coming due and jobs spooled by other processes
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, kind, payload, attempts = job
+            self._running += 1
+            try:
+                follow_ups = await self._handlers[kind](json.loads(payload), attempts) or []
+                for follow_up, _ in follow_ups:
+                    if follow_up not in self._handlers:
+                        raise ValueError(f"No handler registered for job kind '{follow_up}'")
+                await self._run_db(self._complete, job_id, follow_ups)
+                if follow_ups:
+                    self._wakeup.set()
+            except Exception as e:
+                dead = await self._run_db(self._fail, job_id, attempts + 1, repr(e))
+                if dead:
+                    logger.error("Spooled job %s#%s failed permanently after %s attempts: %s", kind, job_id, attempts + 1, e)
+                else:
+                    logger.warning("Spooled job %s#%s failed (attempt %s), will retry: %s", kind, job_id, attempts + 1, e)
+            finally:
+                self._running -= 1
+
+    def depth(self) -> int:
+        """Jobs waiting or running, excluding dead ones."""
+        with self._db_lock:
+            return self._db().execute("SELECT COUNT(*) FROM jobs WHERE dead = 0").fetchone()[0]
+
+    async def drain(self, timeout: float):
+        """Runs spooled jobs until none are due or `timeout` seconds pass; the rest stay on disk."""
+        self.start()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+
+        def due(conn):
+            now = time.time()
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE dead = 0 AND run_after <= ?"
+                " AND (leased_until IS NULL OR leased_until < ?)",
+                (now, now),
+            ).fetchone()[0]
+
+        while time.monotonic() < deadline:
+            if self._running == 0 and await self._run_db(due) == 0:
+                return
+            await asyncio.sleep(0.1)
+        logger.warning("Job spool not drained before shutdown, %s jobs left on disk", await asyncio.to_thread(self.depth))
+
+
+job_spool = JobSpool(
+    path=config.SPOOL_PATH,
+    workers=config.SPOOL_WORKERS,
+    max_attempts=config.SPOOL_MAX_ATTEMPTS,
+    retry_backoff=config.SPOOL_RETRY_BACKOFF,
+    lease=config.SPOOL_LEASE,
+)
@@ -7,6 +7,8 @@ from langchain_core.messages import AIMessage, HumanMessage
 from .supabase_tools import SupabaseHelper
 import config
 
+logger = logging.getLogger("livekit.langchain_tools")
+
 class LangChainAgentHelper:
     def __init__(self, supabase_client, system_prompt: str):
         self.llm = ChatOpenAI(model="gpt-4o", temperature=0.7, api_key=config.OPENAI_API_KEY)
@@ -63,4 +65,4 @@ class LangChainAgentHelper:
     async def add_message(self, text: str, metadata: dict):
         """Adds a new message to the vector store."""
         await self.vector_store.aadd_texts([text], [metadata])
-        logging.info(f"Added '{metadata['role']}' message to vector store.")
\ No newline at end of file
+        logger.info("Added '%s' message to vector store.", metadata['role'])
\ No newline at end of file
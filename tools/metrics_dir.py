@@ -0,0 +1,32 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import config
+
+
+def prepare_metrics_dir():
+    """
+    Sets up prometheus_client's multiprocess mode for the worker process. With the process
+    executor, sessions, call latencies and bootstrap timings are all recorded in job
+    processes, so they write their samples to PROMETHEUS_MULTIPROC_DIR (inherited by every
+    child) and /metrics aggregates the directory. It is emptied here so counters and the
+    live gauges of dead processes do not carry over from an earlier run.
+
+    Must run in the worker process before anything imports prometheus_client.
+    """
+    if "prometheus_client" in sys.modules:
+        raise RuntimeError("prepare_metrics_dir() must run before prometheus_client is imported")
+
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        if config.JOB_EXECUTOR != "process":
+            return
+        path = os.path.join(tempfile.gettempdir(), f"nijo-prometheus-{os.getpid()}")
+        atexit.register(shutil.rmtree, path, ignore_errors=True)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
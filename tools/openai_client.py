@@ -0,0 +1,13 @@
+from openai import OpenAI
+
+import config
+
+_client: OpenAI | None = None
+
+
+def get_openai_client() -> OpenAI:
+    """Process-wide sync OpenAI client, shared by the summariser and agent tools and created on first use."""
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=config.OPENAI_API_KEY)
+    return _client
@@ -1,6 +1,6 @@
 from typing import Dict
 from livekit.agents import function_tool, RunContext
-from tools.supabase_tools import SupabaseHelper
+from tools.supabase_tools import get_db
 import logging
 from datetime import datetime
 import asyncio
@@ -106,17 +106,17 @@ def create_set_parental_rules_tool():
                 else:
                     update_data[field] = value
 
-            supabase = SupabaseHelper()
+            supabase = get_db()
             result = await supabase.update_parental_rule(device_id, update_data)
             if result:
                 updated_fields = ", ".join(f"{k}={v}" for k, v in update_data.items())
-                logger.info(f"Successfully updated parental rules for device_id {device_id}: {updated_fields}")
+                logger.info("Successfully updated parental rules for device_id %s: %s", device_id, updated_fields)
                 return f"Updated parental rules for device_id {device_id}: {updated_fields}"
             else:
-                logger.error(f"Failed to update parental rules for device_id {device_id}")
+                logger.error("Failed to update parental rules for device_id %s", device_id)
                 return f"Failed to update parental rules for device_id {device_id}"
         except Exception as e:
-            logger.error(f"Error in set_parental_rules handler: {e}, raw_arguments={raw_arguments}")
+            logger.error("Error in set_parental_rules handler: %s, raw_arguments=%s", e, raw_arguments)
             return f"Sorry, I couldn't update parental rules. Please try again."
 
     return function_tool(handler, raw_schema=schema)
@@ -173,16 +173,16 @@ def create_parental_tool(field: str, field_type: str):
                 except ValueError:
                     raise ValueError(f"Invalid bedtime format: {value}. Use 'HH:MM AM/PM' (e.g., '9:00 PM').")
 
-            supabase = SupabaseHelper()
+            supabase = get_db()
             result = await supabase.update_parental_rule(device_id, {field: value})
             if result:
-                logger.info(f"Updated {field} to {value} for device_id {device_id}")
+                logger.info("Updated %s to %s for device_id %s", field, value, device_id)
                 return f"Updated {field} to {value} for device_id {device_id}"
             else:
-                logger.error(f"Failed to update {field} for device_id {device_id}")
+                logger.error("Failed to update %s for device_id %s", field, device_id)
                 return f"Failed to update {field} for device_id {device_id}"
         except Exception as e:
-            logger.error(f"Error in set_{field} handler: {e}, raw_arguments={raw_arguments}")
+            logger.error("Error in set_%s handler: %s, raw_arguments=%s", field, e, raw_arguments)
             return f"Sorry, I couldn't update {field}. Please try again."
 
     return function_tool(handler, raw_schema=schema)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+import config
+from tools.summariser_tool import summarize_last_sessions
+from tools.vector_index import evict_index, is_claimed, load_index
+from tools.worker_metrics import BOOTSTRAP_SECONDS, BOOTSTRAP_WAIT_SECONDS
+
+logger = logging.getLogger("livekit.session_bootstrap")
+
+# Fallback for each piece of session context that fails or misses the deadline.
+FIELD_DEFAULTS = {
+    "child_profile": dict,
+    "personality": dict,
+    "parental_instructions": dict,
+    "last_sessions": list,
+    "ctx_summaries": list,
+    "preferences": dict,
+}
+
+# job id -> bootstrap started speculatively when the job was accepted
+_prefetches: Dict[str, "PendingBootstrap"] = {}
+
+
+@dataclass
+class SessionBootstrap:
+    child_profile: Dict[str, Any] = field(default_factory=dict)
+    personality: Dict[str, Any] = field(default_factory=dict)
+    parental_instructions: Dict[str, Any] = field(default_factory=dict)
+    last_sessions: list = field(default_factory=list)
+    ctx_summaries: list = field(default_factory=list)
+    preferences: Dict[str, Any] = field(default_factory=dict)
+    # fetch name -> seconds spent; fetch name -> "ok" | "empty" | "error" | "timeout"
+    timings: Dict[str, float] = field(default_factory=dict)
+    status: Dict[str, str] = field(default_factory=dict)
+
+
+class PendingBootstrap:
+    """The in-flight fetches for one device, started by `start_bootstrap`."""
+
+    def __init__(self, db, device_id: str):
+        self.device_id = device_id
+        self.started = time.perf_counter()
+        self._timings: Dict[str, float] = {}
+
+        last_sessions = self._timed("last_sessions", db.get_last_n_conversations(device_id, 5))
+
+        async def summaries():
+            return await summarize_last_sessions(await last_sessions, db=db)
+
+        self.tasks: Dict[str, asyncio.Task] = {
+            "child_profile": self._timed("child_profile", db.fetch_child_profile(device_id)),
+            "personality": self._timed("personality", db.fetch_toy_personality(device_id)),
+            "parental_instructions": self._timed("parental_instructions", db.fetch_parental_rules(device_id)),
+            "last_sessions": last_sessions,
+            "ctx_summaries": self._timed("ctx_summaries", summaries()),
+            "preferences": self._timed("preferences", db.get_interests(device_id)),
+        }
+
+        # Memory lookups fall back to the RPC until this lands, so nothing waits on it
+        self.index_task = asyncio.create_task(load_index(db, device_id)) if config.LOCAL_RAG_ENABLED else None
+
+    def _timed(self, name: str, coro) -> asyncio.Task:
+        async def runner():
+            start = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                self._timings[name] = time.perf_counter() - start
+        return asyncio.create_task(runner(), name=f"bootstrap:{name}")
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+        if self.index_task is not None:
+            self.index_task.cancel()
+            # The index may already be loaded; nobody would ever evict it for an abandoned prefetch
+            if not is_claimed(self.device_id):
+                evict_index(self.device_id)
+
+    async def collect(self, timeout: float | None = None) -> SessionBootstrap:
+        """
+        Waits at most `timeout` seconds for the fetches still running.
+        Whatever finished in time is kept; every missing field falls back to its default.
+        """
+        timeout = config.BOOTSTRAP_TIMEOUT if timeout is None else timeout
+        waited_from = time.perf_counter()
+        done, pending = await asyncio.wait(self.tasks.values(), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        result = SessionBootstrap()
+        for name, task in self.tasks.items():
+            value = None
+            if task not in done:
+                result.status[name] = "timeout"
+                result.timings[name] = time.perf_counter() - self.started
+            elif task.exception() is not None:
+                logger.warning("Bootstrap fetch '%s' failed for %s: %r", name, self.device_id, task.exception())
+                result.status[name] = "error"
+                result.timings[name] = self._timings.get(name, 0.0)
+            else:
+                value = task.result()
+                result.status[name] = "ok" if value else "empty"
+                result.timings[name] = self._timings.get(name, 0.0)
+            setattr(result, name, value or FIELD_DEFAULTS[name]())
+            BOOTSTRAP_SECONDS.labels(name, result.status[name]).observe(result.timings[name])
+
+        waited = time.perf_counter() - waited_from
+        BOOTSTRAP_WAIT_SECONDS.observe(waited)
+        report = ", ".join(
+            f"{name}={result.timings[name] * 1000:.0f}ms/{result.status[name]}" for name in self.tasks
+        )
+        logger.info("Session bootstrap for %s waited %.0fms: %s", self.device_id, waited * 1000, report)
+        return result
+
+
+def start_bootstrap(db, device_id: str) -> PendingBootstrap:
+    """Fans out every fetch a session needs without waiting for any of them."""
+    return PendingBootstrap(db, device_id)
+
+
+async def bootstrap_session(db, device_id: str, timeout: float | None = None) -> SessionBootstrap:
+    """Fetches everything a session needs concurrently and waits at most `timeout` seconds."""
+    return await start_bootstrap(db, device_id).collect(timeout)
+
+
+def start_prefetch(job_id: str, db, device_id: str):
+    """Starts warming the session context for the device a job is expected to serve."""
+    cancel_prefetch(job_id)
+    logger.info("Prefetching session context for %s (job %s)", device_id, job_id)
+    _prefetches[job_id] = start_bootstrap(db, device_id)
+
+
+def take_prefetch(job_id: str, device_id: str) -> PendingBootstrap | None:
+    """Returns the job's prefetch if it was for `device_id`, cancelling it otherwise."""
+    pending = _prefetches.pop(job_id, None)
+    if pending is None:
+        return None
+    if pending.device_id != device_id:
+        logger.info("Prefetch for %s did not match participant %s, cancelling", pending.device_id, device_id)
+        pending.cancel()
+        return None
+    return pending
+
+
+def cancel_prefetch(job_id: str):
+    pending = _prefetches.pop(job_id, None)
+    if pending is not None:
+        pending.cancel()
@@ -0,0 +1,94 @@
+import builtins
+import importlib.util
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Times module imports and named initialization steps for `python main.py --profile-startup`.
+    Imports are timed through a `builtins.__import__` hook, like `python -X importtime`: each
+    module gets its cumulative time and its self time, excluding the modules it imported.
+    Steps are always recorded, the import hook only once installed.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # module -> (cumulative seconds, self seconds)
+        self.imports: dict[str, tuple[float, float]] = {}
+        self.steps: list[tuple[str, float]] = []
+        self._children: list[float] = []
+        self._original_import = None
+
+    @property
+    def installed(self) -> bool:
+        return self._original_import is not None
+
+    def install(self):
+        if not self.installed:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self.installed:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level:
+            try:
+                module = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__"))
+            except (ImportError, ValueError):
+                pass
+        if module in sys.modules and not fromlist:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        new = module not in sys.modules
+        # `from package import submodule` loads the submodule without going through the hook
+        new_from = [f"{module}.{item}" for item in fromlist or () if item != "*" and f"{module}.{item}" not in sys.modules]
+        start = time.perf_counter()
+        self._children.append(0.0)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            if new and module in sys.modules:
+                self.imports[module] = (elapsed, elapsed - children)
+            elif new_from:
+                for submodule in new_from:
+                    if submodule in sys.modules:
+                        self.imports[submodule] = (elapsed, elapsed - children)
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def report(self, top: int = 30) -> str:
+        packages: dict[str, float] = {}
+        for module, (_, own) in self.imports.items():
+            package = module.split(".")[0]
+            packages[package] = packages.get(package, 0.0) + own
+
+        lines = [f"Startup profile, {(time.perf_counter() - self.started) * 1000:.0f}ms since the profiler loaded", ""]
+        lines.append(f"{'import (cumulative)':<56} {'cumul ms':>9} {'self ms':>9}")
+        for module, (cumulative, own) in sorted(self.imports.items(), key=lambda item: -item[1][0])[:top]:
+            lines.append(f"{module:<56} {cumulative * 1000:>9.1f} {own * 1000:>9.1f}")
+        lines += ["", f"{'import self time by package':<56} {'ms':>9}"]
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"{package:<56} {own * 1000:>9.1f}")
+        lines += ["", f"{'initialization step':<56} {'ms':>9}"]
+        for name, elapsed in self.steps:
+            lines.append(f"{name:<56} {elapsed * 1000:>9.1f}")
+        return "\n".join(lines)
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,167 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+
+import config
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-8s %(name)s %(message)s"
+
+# Patterns scrubbed from every rendered message
+REDACTIONS = [
+    (re.compile(r"sk-[A-Za-z0-9_\-]{16,}"), "sk-***"),
+    (re.compile(r"eyJ[A-Za-z0-9_\-]+\.[A-Za-z0-9_\-]+\.[A-Za-z0-9_\-]+"), "***jwt***"),
+    # Embedding vectors and other long runs of floats
+    (re.compile(r"\[\s*(?:-?\d+\.\d+(?:[eE]-?\d+)?\s*,\s*){16,}-?\d+\.\d+(?:[eE]-?\d+)?\s*\]"), "[vector]"),
+]
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+# LogRecord attributes; anything else on a record came in through `extra=` and is emitted as a field
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: "DeferredQueueHandler | None" = None
+
+
+def parse_sampling(spec: str | None) -> dict[str, float]:
+    """Parses "livekit.agents=0.1,livekit.router=0.5" into logger prefix -> kept fraction."""
+    rates = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, rate = part.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the sub-WARNING records of the configured loggers, matched
+    by the longest logger name prefix. Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._by_logger: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._by_logger.get(name)
+        if rate is None:
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._by_logger[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without rendering them, so %-style messages are
+    only formatted off the event loop. Records whose arguments are not plain values are
+    rendered here, since the objects could change before the listener gets to them.
+    When the queue is full, records are dropped and counted rather than blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and not all(isinstance(arg, _PRIMITIVES) for arg in record.args):
+            record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            # Tracebacks reference live frames, so they are rendered before crossing threads
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RedactingQueueListener(logging.handlers.QueueListener):
+    """Renders each record once, then redacts it and caps its size before any handler sees it."""
+
+    def __init__(self, log_queue, *handlers, max_chars: int):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.max_chars = max_chars
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        try:
+            message = record.getMessage()
+        except Exception as e:
+            message = f"{record.msg!r} (unformattable: {e!r})"
+        for pattern, replacement in REDACTIONS:
+            message = pattern.sub(replacement, message)
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}… [{len(message) - self.max_chars} chars truncated]"
+        record.msg, record.args = message, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed with `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging():
+    """
+    Routes every log record through a bounded queue to a listener thread, which does the
+    rendering, redaction and stdout/file I/O. Levels, sampling and the output format come
+    from config; safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if config.LOG_FILE:
+        handlers.append(logging.handlers.WatchedFileHandler(config.LOG_FILE))
+    formatter = JsonFormatter() if config.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    _queue_handler = DeferredQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(parse_sampling(config.LOG_SAMPLING)))
+
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(config.LOG_LEVEL)
+    # Our own loggers live under "livekit." too, so the framework gets its own level
+    logging.getLogger("livekit").setLevel(config.LOG_LEVEL)
+    logging.getLogger("livekit.agents").setLevel(config.LIVEKIT_LOG_LEVEL)
+    logging.getLogger("livekit.plugins").setLevel(config.LIVEKIT_LOG_LEVEL)
+
+    _listener = RedactingQueueListener(log_queue, *handlers, max_chars=config.LOG_MAX_MESSAGE_CHARS)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def dropped_records() -> int:
+    """Records dropped because the log queue was full."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
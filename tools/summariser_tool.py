@@ -1,74 +1,44 @@
-from openai import OpenAI
-import config
+import asyncio
+import json
 import logging
+from tools.openai_client import get_openai_client
 from tools.supabase_tools import SupabaseHelper
+from tools.tracing import traced
+from tools.worker_metrics import timed_call
 
-client = OpenAI(api_key=config.OPENAI_API_KEY)
-db = SupabaseHelper()
+logger = logging.getLogger("livekit.summariser")
 
-async def summarize_last_sessions(session_texts: list[str]) -> list[str]:
-    """
-    Summarizes the last 5 session transcripts into 2 lines each.
-    
-    :param session_texts: List of session transcripts (most recent last)
-    :return: List of 2-line summaries
+SUMMARY_INSTRUCTIONS = """
+    Summarize the following session in **2 concise lines** focusing on:
+    - Main topics the child talked about
+    - Child's mood or preferences
+    - Anything notable for personalization
     """
-    summaries = []
-    
-    for i, text in enumerate(session_texts[-5:]):  # Take last 5 sessions
-        prompt = f"""
-        Summarize the following session in **2 concise lines** focusing on:
-        - Main topics the child talked about
-        - Child's mood or preferences
-        - Anything notable for personalization
-        Session Transcript:
-        {text}
-        """
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a friendly AI assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5
-        )
-        summary_text = response.choices[0].message.content.strip()
-        summaries.append(summary_text)
 
-    
-    return summaries
+# Keeps summary backfill writes alive until they finish.
+_backfill_tasks: set[asyncio.Task] = set()
 
 
-async def archive_nth_last_session(db, child_id: str, n: int):
-    print("archiving last session")
-    db = SupabaseHelper()
-
-    session_res = db.client.table("conversation_logs") \
-        .select("id, content") \
-        .eq("child_id", child_id) \
-        .order("created_at", desc=True) \
-        .range(n-1, n-1) \
-        .execute()
-    
-    print(f"response from archive :: {session_res}")
-
-    if not session_res.data:
-        return None  
-
-    session = session_res.data[0]
-    session_id = session["id"]
-    session_text = session["content"]
+def format_transcript(content) -> str:
+    """Turns a stored `conversation_logs.content` value into plain transcript text."""
+    if isinstance(content, list):
+        return "\n".join(
+            f"{m.get('role', 'user')}: {m.get('content', '')}" if isinstance(m, dict) else str(m)
+            for m in content
+        )
+    return str(content or "")
 
-    # Summarize with OpenAI
-    prompt = f"""
-    Summarize the following session in **2 concise lines** focusing on:
-    - Main topics the child talked about
-    - Child's mood or preferences
-    - Anything notable for personalization
+
+@traced("llm.summarize_session")
+@timed_call("openai", "summarize_session")
+async def summarize_session(content) -> str:
+    """Summarizes one session transcript into 2 lines. Called once, when the session ends."""
+    prompt = f"""{SUMMARY_INSTRUCTIONS}
     Session Transcript:
-    {session_text}
+    {format_transcript(content)}
     """
-    response = client.chat.completions.create(
+    response = await asyncio.to_thread(
+        get_openai_client().chat.completions.create,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a friendly AI assistant."},
@@ -76,16 +46,126 @@ async def archive_nth_last_session(db, child_id: str, n: int):
         ],
         temperature=0.5
     )
-    summary_text = response.choices[0].message.content.strip()
+    return response.choices[0].message.content.strip()
+
+
+@traced("llm.update_rolling_summary")
+@timed_call("openai", "update_rolling_summary")
+async def update_rolling_summary(summary: str, turns: list) -> str:
+    """Folds turns that fell out of the live context into the session's running summary."""
+    prompt = f"""
+    Update the running summary of a conversation between a child and their toy with the new turns below.
+    Keep names, interests, feelings and open questions; drop small talk. Stay under 120 words.
+
+    Current summary:
+    {summary or "(none yet)"}
+
+    New turns:
+    {format_transcript(turns)}
+    """
+    response = await asyncio.to_thread(
+        get_openai_client().chat.completions.create,
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+    )
+    return response.choices[0].message.content.strip()
+
+
+@traced("llm.summarize_batch")
+@timed_call("openai", "summarize_batch")
+async def _summarize_batch(contents: list) -> list[str]:
+    """Summarizes several transcripts in a single call, preserving their order."""
+    transcripts = "\n\n".join(
+        f"### Session {i + 1}\n{format_transcript(content)}" for i, content in enumerate(contents)
+    )
+    prompt = f"""{SUMMARY_INSTRUCTIONS}
+    Do this separately for each of the {len(contents)} sessions below.
+    Return JSON like this, with one entry per session in the same order:
+    {{"summaries": ["<session 1 summary>", "<session 2 summary>"]}}
+
+    {transcripts}
+    """
+    response = await asyncio.to_thread(
+        get_openai_client().chat.completions.create,
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a friendly AI assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.5,
+        response_format={"type": "json_object"},
+    )
+    summaries = json.loads(response.choices[0].message.content).get("summaries", [])
+    if len(summaries) != len(contents):
+        raise ValueError(f"Expected {len(contents)} summaries, got {len(summaries)}")
+    return [str(s).strip() for s in summaries]
+
+
+async def summarize_last_sessions(sessions: list[dict], db: SupabaseHelper | None = None) -> list[str]:
+    """
+    Returns a 2-line summary for each of the last 5 sessions.
+    Summaries stored at session end are used as-is; rows without one are summarized
+    together in a single call and, when `db` is given, written back in the background.
+    Transcripts are only fetched for those rows, when they were not selected with the row.
+
+    :param sessions: `conversation_logs` rows with `id` and `summary`, and optionally `content`
+    :return: List of 2-line summaries, in the order given
+    """
+    sessions = sessions[:5]
+    missing = [row for row in sessions if not row.get("summary")]
+
+    if missing:
+        try:
+            unfetched = [row["id"] for row in missing if "content" not in row and row.get("id") is not None]
+            if unfetched and db is not None:
+                contents = await db.get_conversation_contents(unfetched)
+                for row in missing:
+                    row.setdefault("content", contents.get(row.get("id")))
+            generated = await _summarize_batch([row.get("content") for row in missing])
+        except Exception as e:
+            logger.error("Error summarizing sessions without a stored summary: %s", e)
+            generated = [None] * len(missing)
+        for row, summary in zip(missing, generated):
+            row["summary"] = summary
+
+        if db is not None:
+            rows = [row for row in missing if row.get("summary") and row.get("id") is not None]
+            if rows:
+                task = asyncio.create_task(_backfill_summaries(db, rows))
+                _backfill_tasks.add(task)
+                task.add_done_callback(_backfill_tasks.discard)
+
+    return [row["summary"] for row in sessions if row.get("summary")]
+
+
+async def _backfill_summaries(db: SupabaseHelper, rows: list[dict]):
+    results = await asyncio.gather(
+        *(db.set_conversation_summary(row["id"], row["summary"]) for row in rows),
+        return_exceptions=True,
+    )
+    for row, result in zip(rows, results):
+        if isinstance(result, Exception):
+            logger.error("Error storing summary for conversation %s: %s", row["id"], result)
+
+
+async def archive_nth_last_session(db, child_id: str, n: int):
+    logger.debug("Archiving session %d for %s", n, child_id)
+
+    session = await db.get_nth_last_conversation(child_id, n)
+    logger.debug("Session to archive: %s", session)
+
+    if not session:
+        return None
+
+    session_id = session["id"]
+
+    # Reuse the summary written when the session ended, if there is one
+    summary_text = session.get("summary") or await summarize_session(session["content"])
 
     # Update the same row to store the summary
-    res = db.client.table("conversation_logs") \
-        .update({
-            "content": summary_text,
-        }) \
-        .eq("id", session_id) \
-        .execute()
-    
-    print(f"updated summary for conversation :: {res}")
-
-    return summary_text
\ No newline at end of file
+    await db.replace_conversation_with_summary(session_id, summary_text)
+
+    logger.debug("Replaced conversation %s with its summary", session_id)
+
+    return summary_text
@@ -1,40 +1,141 @@
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import aiohttp
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions
 import config
 import logging
 from .agent_personality import personalities
+from .context_cache import context_cache, MISSING
+from .vector_index import get_index
+from .tracing import span
+from .worker_metrics import track_call
 
 logger = logging.getLogger("livekit.supabase_tools")
 
+# One bounded pool for every blocking supabase call, so DB latency never stalls the event loop
+# and a slow database cannot pile up an unbounded number of threads.
+_db_executor = ThreadPoolExecutor(max_workers=config.DB_MAX_WORKERS, thread_name_prefix="supabase")
+
+INTEREST_CATEGORIES = ["Hobbies", "Sports", "Favorite_Food", "Topics"]
+
+_shared_client: Client | None = None
+_shared_helper: "SupabaseHelper | None" = None
+_registry_lock = threading.RLock()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def dedupe_interests(interests: dict[str, list[str]]) -> dict[str, list[str]]:
+    """
+    Drops empty items and case/whitespace variants within each category, keeping the
+    first spelling seen with its whitespace collapsed.
+    """
+    deduped = {}
+    for category, items in interests.items():
+        seen = {}
+        for item in items or []:
+            if not isinstance(item, str):
+                continue
+            item = " ".join(item.split())
+            if item:
+                seen.setdefault(item.casefold(), item)
+        deduped[category] = list(seen.values())
+    return deduped
+
+
+def get_supabase_client() -> Client:
+    """
+    Process-wide supabase client, created on first use.
+    All PostgREST traffic shares one keep-alive (HTTP/2 when available) connection pool,
+    bounded to DB_MAX_CONNECTIONS, instead of a fresh client and TLS handshake per helper.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _registry_lock:
+            if _shared_client is None:
+                http_client = httpx.Client(
+                    http2=_http2_available(),
+                    limits=httpx.Limits(
+                        max_connections=config.DB_MAX_CONNECTIONS,
+                        max_keepalive_connections=config.DB_MAX_CONNECTIONS,
+                        keepalive_expiry=config.DB_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=config.DB_HTTP_TIMEOUT,
+                )
+                _shared_client = create_client(
+                    config.SUPABASE_URL,
+                    config.SUPABASE_KEY,
+                    options=ClientOptions(httpx_client=http_client),
+                )
+                logger.info("Created shared Supabase client")
+    return _shared_client
+
+
+def get_db() -> "SupabaseHelper":
+    """Process-wide SupabaseHelper on the shared client. Inject this rather than constructing helpers."""
+    global _shared_helper
+    if _shared_helper is None:
+        with _registry_lock:
+            if _shared_helper is None:
+                _shared_helper = SupabaseHelper()
+    return _shared_helper
+
+
 class SupabaseHelper:
-    def __init__(self):
-        self.client: Client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+    def __init__(self, client: Client | None = None):
+        self.client: Client = client or get_supabase_client()
+
+    async def execute(self, name: str, query):
+        """
+        Runs a built supabase/postgrest query on the DB thread pool and returns its response,
+        traced as "db.<name>" and timed under `name`. Call sites name the query after their method.
+        """
+        loop = asyncio.get_running_loop()
+        with span(f"db.{name}"), track_call("db", name):
+            return await loop.run_in_executor(_db_executor, query.execute)
 
     async def fetch_child_profile(self, device_id: str):
         """Fetches the child's profile using the device_id."""
+        cached = context_cache.get(device_id, "child_profile")
+        if cached is not MISSING:
+            return cached
         try:
-            def run_query():
-                return self.client.table('child_profiles').select("*").eq('device_id', device_id).single().execute()
-
-            response = await asyncio.to_thread(run_query)
+            response = await self.execute(
+                "fetch_child_profile",
+                self.client.table('child_profiles').select("*").eq('device_id', device_id).single()
+            )
+            if response.data is not None:
+                context_cache.set(device_id, "child_profile", response.data)
             return response.data
         except Exception as e:
-            logging.error(f"Error fetching child profile: {e}")
+            logger.error("Error fetching child profile: %s", e)
             return None
 
     async def fetch_toy_personality(self, child_id: str):
         """Fetches the toy's personality for a given child."""
+        cached = context_cache.get(child_id, "toy_personality")
+        if cached is not MISSING:
+            return cached
         try:
-            def run_query():
-                return (self.client.table('toy_personality')
-                        .select("*")
-                        .eq('child_id', child_id)
-                        .order('last_updated', desc=True)
-                        .limit(1)
-                        .single()
-                        .execute())
-            response = await asyncio.to_thread(run_query)
+            response = await self.execute(
+                "fetch_toy_personality",
+                self.client.table('toy_personality')
+                .select("*")
+                .eq('child_id', child_id)
+                .order('last_updated', desc=True)
+                .limit(1)
+                .single()
+            )
+            if response.data is not None:
+                context_cache.set(child_id, "toy_personality", response.data)
             return response.data
         except Exception:
             return {'energy': 0.5, 'humor': 0.5, 'curiosity': 0.5, 'empathy': 0.5, 'role_identity': 'Best Friend'}
@@ -47,8 +148,9 @@ class SupabaseHelper:
             personality_data = personalities[personality]
 
         try:
-            def run_query():
-                return self.client.table('toy_personality').upsert({
+            response = await self.execute(
+                "set_toy_personality",
+                self.client.table('toy_personality').upsert({
                     "child_id": child_id,
                     "role_identity": personality_data["role_identity"],
                     "description": personality_data["description"],
@@ -57,45 +159,55 @@ class SupabaseHelper:
                     "curiosity": personality_data["curiosity"],
                     "empathy": personality_data["empathy"],
                     "last_updated": "now()"
-                }).execute()
-            response = await asyncio.to_thread(run_query)
+                })
+            )
+            context_cache.invalidate(child_id, "toy_personality")
             return response.data
         except Exception as e:
-            logging.error(f"Error setting toy personality: {e}")
+            logger.error("Error setting toy personality: %s", e)
             return personality_data
 
 
     async def fetch_parental_rules(self, child_id: str):
         """Fetches parental rules for a given child."""
+        cached = context_cache.get(child_id, "parental_rules")
+        if cached is not MISSING:
+            return cached
         try:
-            response = await self.client.table('parental_rules').select("*").eq('child_id', child_id).single().execute()
-            print(f"response from parental rules :: {response}")
+            response = await self.execute(
+                "fetch_parental_rules",
+                self.client.table('parental_rules').select("*").eq('child_id', child_id).single()
+            )
+            logger.debug("Parental rules response: %s", response)
+            if response.data is not None:
+                context_cache.set(child_id, "parental_rules", response.data)
             return response.data
         except Exception:
             return {}
 
     async def update_parental_rule(self, device_id: str, rule: dict) -> bool:
-        def run_upsert():
-            return self.client.table("parental_rules").upsert(
-                {"device_id": device_id, **rule},
-                on_conflict="device_id"
-            ).execute()
         try:
-            response = await asyncio.to_thread(run_upsert)
+            response = await self.execute(
+                "update_parental_rule",
+                self.client.table("parental_rules").upsert(
+                    {"device_id": device_id, **rule},
+                    on_conflict="device_id"
+                )
+            )
+            context_cache.invalidate(device_id, "parental_rules")
             if response.data:
-                logger.info(f"Updated parental rule for device_id: {device_id}")
+                logger.info("Updated parental rule for device_id: %s", device_id)
                 return True
-            logger.error(f"Failed to update parental rule for device_id: {device_id}")
+            logger.error("Failed to update parental rule for device_id: %s", device_id)
             return False
         except Exception as e:
-            logger.error(f"Error updating parental rule for device_id {device_id}: {e}")
+            logger.error("Error updating parental rule for device_id %s: %s", device_id, e)
             raise
         
     async def set_interests(self, user_id: str, category: str, items: list[str]):
         """Set or update a user's interests for a category."""
-        valid_categories = ["Hobbies", "Sports", "Favorite_Food", "Topics"]
-        if category not in valid_categories:
-            raise ValueError(f"Invalid category. Must be one of {valid_categories}")
+        if category not in INTEREST_CATEGORIES:
+            raise ValueError(f"Invalid category. Must be one of {INTEREST_CATEGORIES}")
 
         data = {
             "user_id": user_id,
@@ -103,46 +215,134 @@ class SupabaseHelper:
             "items": items
         }
 
-        response = await self.client.table("user_interests").upsert(data).execute()
+        response = await self.execute("set_interests", self.client.table("user_interests").upsert(data))
+        context_cache.invalidate(user_id, "interests")
 
         if response.data:
-            print("Interests set successfully:", response.data)
+            logger.debug("Interests set for %s: %s", user_id, category)
         else:
-            print("Error setting interests:", response)
+            logger.error("Error setting interests for %s: %s", user_id, response)
+
+    async def merge_user_interests(self, user_id: str, interests: dict[str, list[str]]):
+        """
+        Adds new items to any number of a user's interest categories in one round trip.
+        The `merge_user_interests` RPC upserts one row per category and unions the item
+        arrays server-side (case-insensitively), so concurrent sessions cannot lose items.
+
+        Defined in supabase/migrations/, with the unique (user_id, category) index it relies on.
+        """
+        unknown = set(interests) - set(INTEREST_CATEGORIES)
+        if unknown:
+            raise ValueError(f"Invalid categories {sorted(unknown)}. Must be one of {INTEREST_CATEGORIES}")
+
+        interests = {category: items for category, items in dedupe_interests(interests).items() if items}
+        if not interests:
+            return
+        await self.execute(
+            "merge_user_interests",
+            self.client.rpc('merge_user_interests', {
+                'p_user_id': user_id,
+                'p_interests': interests,
+            })
+        )
+        context_cache.invalidate(user_id, "interests")
 
     async def get_interests(self, child_id: str):
         """Fetch all interests for a given user."""
-        response = self.client.table("user_interests").select("*").eq("user_id", child_id).execute()
+        cached = context_cache.get(child_id, "interests")
+        if cached is not MISSING:
+            return cached
+        response = await self.execute("get_interests", self.client.table("user_interests").select("*").eq("user_id", child_id))
 
         if not response.data:
+            context_cache.set(child_id, "interests", {})
             return {}
 
         interests = {row["category"]: row["items"] for row in response.data}
+        context_cache.set(child_id, "interests", interests)
         return interests
 
-    async def log_conversation(self, child_id: str, content: list, embedding: list):
+    async def log_conversation(self, child_id: str, content: list, embedding: list | None = None, summary: str | None = None):
+        """Stores a session transcript and returns the new conversation_logs id."""
         try:
-            print(f"saving conversation to db :::: {content}")
-            await self.client.table('conversation_logs').insert({
-                'child_id': child_id,
-                'content': content,
-                'embedding': embedding
-            }).execute()
+            logger.debug("Saving conversation for %s (%d turns)", child_id, len(content))
+            response = await self.execute(
+                "log_conversation",
+                self.client.table('conversation_logs').insert({
+                    'child_id': child_id,
+                    'content': content,
+                    'embedding': embedding,
+                    'summary': summary
+                })
+            )
+            return response.data[0]["id"] if response.data else None
         except Exception as e:
-            print(f"Error logging conversation: {e}")
+            logger.error("Error logging conversation: %s", e)
+            return None
+
+    async def append_conversation_turns(self, session_id, turns: list):
+        """Appends turns to a session's transcript server-side, sending only the new turns."""
+        await self.execute(
+            "append_conversation_turns",
+            self.client.rpc('append_conversation_turns', {
+                'p_session_id': session_id,
+                'p_turns': turns,
+            })
+        )
+
+    async def count_conversation_turns(self, session_id) -> int:
+        """Number of turns a session's conversation_logs row currently holds, counted server-side."""
+        response = await self.execute(
+            "count_conversation_turns",
+            self.client.rpc('conversation_turn_count', {'p_session_id': session_id})
+        )
+        return response.data or 0
+
+    async def log_conversation_chunks(self, session_id, child_id: str, chunks: list, embeddings: list):
+        """Stores the turn-window chunks of a session, each with its own embedding. Raises on failure."""
+        rows = [
+            {
+                'session_id': session_id,
+                'child_id': child_id,
+                'turn_start': chunk.turn_start,
+                'turn_end': chunk.turn_end,
+                'content': chunk.content,
+                'embedding': embedding,
+            }
+            for chunk, embedding in zip(chunks, embeddings)
+        ]
+        if not rows:
+            return
+        await self.execute("log_conversation_chunks", self.client.table('conversation_chunks').insert(rows))
+        index = get_index(child_id)
+        if index is not None:
+            for row in rows:
+                index.add(row['content'], row['embedding'])
+
+    async def set_conversation_summary(self, conversation_id, summary: str):
+        """Stores the precomputed summary next to its conversation_logs row."""
+        await self.execute(
+            "set_conversation_summary",
+            self.client.table('conversation_logs')
+            .update({'summary': summary})
+            .eq('id', conversation_id)
+        )
 
     async def get_last_n_conversations(self, child_id: str, n: int):
         """
-        Fetch the last 5 conversation messages for a child.
-        Returns a list of dicts with role, content, and timestamp.
+        Fetch the last n conversations for a child, most recent first.
+        Returns a list of dicts with id, summary, and timestamp; transcripts are left out,
+        see `get_conversation_contents`.
         """
         try:
-            response = self.client.table('conversation_logs')\
-                .select("content, created_at")\
-                .eq('child_id', child_id)\
-                .order('created_at', desc=True)\
-                .limit(n)\
-                .execute()
+            response = await self.execute(
+                "get_last_n_conversations",
+                self.client.table('conversation_logs')
+                .select("id, summary, created_at")
+                .eq('child_id', child_id)
+                .order('created_at', desc=True)
+                .limit(n)
+            )
 
             if not response.data:
                 return []
@@ -150,28 +350,91 @@ class SupabaseHelper:
             return list(response.data)
 
         except Exception as e:
-            print(f"Error fetching last 5 conversations: {e}")
+            logger.error("Error fetching last conversations: %s", e)
             return []
-        
+
+    async def get_conversation_contents(self, conversation_ids: list) -> dict:
+        """Fetch the transcripts of the given conversations, keyed by id."""
+        if not conversation_ids:
+            return {}
+        response = await self.execute(
+            "get_conversation_contents",
+            self.client.table("conversation_logs")
+            .select("id, content")
+            .in_("id", conversation_ids)
+        )
+        return {row["id"]: row.get("content") for row in response.data or []}
+
+    async def get_nth_last_conversation(self, child_id: str, n: int):
+        """Fetch the nth most recent conversation for a child, or None."""
+        response = await self.execute(
+            "get_nth_last_conversation",
+            self.client.table("conversation_logs")
+            .select("id, content, summary")
+            .eq("child_id", child_id)
+            .order("created_at", desc=True)
+            .range(n-1, n-1)
+        )
+        return response.data[0] if response.data else None
+
+    async def replace_conversation_with_summary(self, conversation_id, summary: str):
+        """Compacts an archived conversation down to its summary."""
+        return await self.execute(
+            "replace_conversation_with_summary",
+            self.client.table("conversation_logs")
+            .update({"content": summary, "summary": summary})
+            .eq("id", conversation_id)
+        )
+
+    async def get_conversation_embeddings(self, child_id: str):
+        """
+        Fetch every stored chunk embedding for a child, for the local vector index, plus the
+        whole-session embeddings of conversations logged before transcripts were chunked.
+        """
+        chunks, legacy = await asyncio.gather(
+            self.execute(
+                "get_conversation_embeddings.chunks",
+                self.client.table('conversation_chunks')
+                .select("id, content, embedding")
+                .eq('child_id', child_id)
+                .not_.is_('embedding', 'null')
+            ),
+            self.execute(
+                "get_conversation_embeddings.logs",
+                self.client.table('conversation_logs')
+                .select("id, content, embedding")
+                .eq('child_id', child_id)
+                .not_.is_('embedding', 'null')
+            ),
+        )
+        return list(chunks.data or []) + list(legacy.data or [])
 
     async def get_rag_context(self, child_id: str, embedding: list, match_threshold: float = 0.50, match_count: int = 5):
-        """Retrieves relevant past conversation snippets."""
+        """Retrieves the past conversation chunks most similar to the query."""
+        index = get_index(child_id)
+        if index is not None:
+            matches = index.query(embedding, match_threshold=match_threshold, match_count=match_count)
+            return "\n".join([f"{item['content']}" for item in matches])
+        params = {
+            'query_embedding': embedding,
+            'p_child_id': child_id,
+            'match_threshold': match_threshold,
+            'match_count': match_count
+        }
         try:
-            response = self.client.rpc('match_conversations', {
-                'query_embedding': embedding,
-                'p_child_id': child_id,
-                'match_threshold': match_threshold,
-                'match_count': match_count
-            }).execute()
-            logger.info(f"RAG response : {response}")
-            return "\n".join([f"{item['content']}" for item in response.data])
+            response = await self.execute("get_rag_context.chunks", self.client.rpc('match_conversation_chunks', params))
+            if not response.data:
+                # Conversations logged before chunking only have a whole-session embedding
+                response = await self.execute("get_rag_context.conversations", self.client.rpc('match_conversations', params))
+            logger.debug("RAG response: %s", response)
+            return "\n".join([f"{item['content']}" for item in response.data or []])
         except Exception as e:
-            print(f"Error fetching RAG context: {e}")
+            logger.error("Error fetching RAG context: %s", e)
             return ""
 
 # Backend sync
 async def save_user_data_to_backend(user: dict):
-    print("requesting to save user")
+    logger.debug("Saving user data to backend")
     url = f"{config.BACKEND_URL}/save-user-data"
     headers = {
         "Content-Type": "application/json",
@@ -188,12 +451,13 @@ async def save_user_data_to_backend(user: dict):
     async with aiohttp.ClientSession() as session:
         try:
             async with session.post(url, json=data_to_send, headers=headers) as response:
+                context_cache.invalidate(user.get("device_id"), "child_profile")
                 if response.status == 200:
-                    print("Successfully saved user data to backend.")
+                    logger.info("Successfully saved user data to backend.")
                     return await response.json()
                 else:
-                    print(f"Error saving user data: {await response.text()}")
+                    logger.error("Error saving user data: %s", await response.text())
                     return None
         except Exception as e:
-            print(f"Failed to connect to backend: {e}")
+            logger.error("Failed to connect to backend: %s", e)
             return None
@@ -0,0 +1,67 @@
+# Stage latency percentiles from a TRACE_FILE written by tools.tracing:
+#   python -m tools.trace_report .cache/traces.jsonl [--agent ConversationStarterAgent] [--device <id>]
+import argparse
+import json
+import math
+from collections import defaultdict
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def stage_name(entry: dict) -> str:
+    # Tools share livekit's "function_tool" span name; report each tool on its own
+    tool = entry["attributes"].get("lk.function_tool.name")
+    return f"function_tool:{tool}" if tool else entry["name"]
+
+
+def load_durations(path: str, agent: str | None = None, device_id: str | None = None) -> dict[str, list[float]]:
+    durations = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            attributes = entry.get("attributes", {})
+            if agent and attributes.get("nijo.agent") != agent:
+                continue
+            if device_id and attributes.get("nijo.device_id") != device_id:
+                continue
+            durations[stage_name(entry)].append(entry["duration_ms"])
+    return durations
+
+
+def stage_stats(durations: dict[str, list[float]]) -> dict[str, dict]:
+    stats = {}
+    for name, values in durations.items():
+        values = sorted(values)
+        stats[name] = {"count": len(values), **{f"p{p}": percentile(values, p) for p in PERCENTILES}}
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage p50/p95/p99 latency from a span file")
+    parser.add_argument("path")
+    parser.add_argument("--agent", help="only spans tagged with this agent class")
+    parser.add_argument("--device", help="only spans tagged with this device_id")
+    parser.add_argument("--json", action="store_true", help="print the stats as JSON")
+    args = parser.parse_args()
+
+    stats = stage_stats(load_durations(args.path, args.agent, args.device))
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+
+    width = max([len(name) for name in stats] + [5])
+    print(f"{'stage':<{width}} {'count':>7} " + " ".join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+    for name, row in sorted(stats.items(), key=lambda item: -item[1]["p95"]):
+        print(f"{name:<{width}} {row['count']:>7} " + " ".join(f"{row[f'p{p}']:>10.1f}" for p in PERCENTILES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+import config
+
+logger = logging.getLogger("livekit.tracing")
+
+# Set per session and per turn; copied into every span started in that context,
+# including the STT/LLM/TTS spans livekit-agents records itself
+_device_id = contextvars.ContextVar("device_id", default=None)
+_agent = contextvars.ContextVar("agent", default=None)
+_turn = contextvars.ContextVar("turn", default=None)
+
+# String attributes longer than this are cut in the file export (chat contexts, instructions)
+MAX_ATTRIBUTE_CHARS = 256
+
+tracer = trace.get_tracer("nijo")
+
+
+class SessionAttributesProcessor(SpanProcessor):
+    """Tags every span with the device, agent class and turn of the context it starts in."""
+
+    def on_start(self, span, parent_context=None):
+        for key, var in (("nijo.device_id", _device_id), ("nijo.agent", _agent), ("nijo.turn", _turn)):
+            value = var.get()
+            if value is not None:
+                span.set_attribute(key, value)
+
+
+class JsonlFileSpanExporter(SpanExporter):
+    """Appends finished spans to a local JSON-lines file, one span per line, for offline analysis."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _attribute(value):
+        if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+            return value[:MAX_ATTRIBUTE_CHARS] + "…"
+        if isinstance(value, tuple):
+            return list(value)
+        return value
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = []
+        for span in spans:
+            lines.append(json.dumps({
+                "name": span.name,
+                "trace_id": format(span.context.trace_id, "032x"),
+                "span_id": format(span.context.span_id, "016x"),
+                "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+                "start": span.start_time / 1e9,
+                "duration_ms": (span.end_time - span.start_time) / 1e6,
+                "status": span.status.status_code.name,
+                "attributes": {key: self._attribute(value) for key, value in (span.attributes or {}).items()},
+            }, default=str))
+        with self._lock:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def setup_tracing():
+    """
+    Installs the process-wide tracer provider when TRACE_FILE or an OTLP endpoint is
+    configured, and hands it to livekit-agents so its STT/LLM/TTS spans land in the same traces.
+    """
+    otlp_endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not config.TRACE_FILE and not otlp_endpoint:
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": config.TRACE_SERVICE_NAME}))
+    provider.add_span_processor(SessionAttributesProcessor())
+    if config.TRACE_FILE:
+        provider.add_span_processor(BatchSpanProcessor(JsonlFileSpanExporter(config.TRACE_FILE)))
+    if otlp_endpoint:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+    from livekit.agents.telemetry import set_tracer_provider
+    set_tracer_provider(provider)
+    logger.info("Tracing enabled (file: %s, otlp: %s)", config.TRACE_FILE, otlp_endpoint)
+
+
+def bind_session(device_id: str):
+    """Tags spans started from here on in the current task, and tasks it creates, with the device."""
+    _device_id.set(device_id)
+
+
+def bind_turn(agent: str, turn: int):
+    _agent.set(agent)
+    _turn.set(turn)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    with tracer.start_as_current_span(name, attributes=attributes or None) as current:
+        yield current
+
+
+def traced(name: str):
+    """Records each call of the decorated coroutine function as a span called `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import config
+from tools.embedding_service import get_embedding_service
+from tools.summariser_tool import format_transcript
+
+logger = logging.getLogger("livekit.transcript_writer")
+
+# Writers with turns that may still need flushing, closed on job shutdown
+_open_writers: set["TranscriptWriter"] = set()
+
+
+@dataclass
+class TurnWindow:
+    # Turns [turn_start, turn_end) of the session transcript
+    turn_start: int
+    turn_end: int
+    content: str
+
+
+class TranscriptWriter:
+    """
+    Write-behind buffer for one session's transcript.
+    Turns are persisted in small batches when `flush_turns` accumulate or `flush_interval`
+    seconds pass, and turn-window chunks are embedded as soon as they are complete, so
+    closing the session only has to write the last few turns.
+    """
+
+    def __init__(self, db, child_id: str, flush_turns: int | None = None, flush_interval: float | None = None):
+        self.db = db
+        self.child_id = child_id
+        self.flush_turns = flush_turns or config.TRANSCRIPT_FLUSH_TURNS
+        self.flush_interval = flush_interval or config.TRANSCRIPT_FLUSH_INTERVAL
+        self.session_id = None
+        self._pending: list[dict] = []
+        # Persisted turns not yet fully covered by an embedded window, starting at _chunk_offset
+        self._unchunked: list[dict] = []
+        self._chunk_offset = 0
+        self._chunked_until = 0
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self._flushing: asyncio.Task | None = None
+
+    def append(self, role: str, content: str):
+        self._pending.append({"role": role, "content": content})
+        _open_writers.add(self)
+        if len(self._pending) >= self.flush_turns:
+            self._start_flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._start_flush()
+
+    def _start_flush(self):
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def flush(self, final: bool = False):
+        async with self._lock:
+            if await self._persist_pending():
+                await self._embed_windows(final)
+
+    async def _persist_pending(self) -> bool:
+        """Writes the pending turns; on failure they stay pending and False is returned."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return True
+        try:
+            if self.session_id is None:
+                self.session_id = await self.db.log_conversation(child_id=self.child_id, content=batch)
+                if self.session_id is None:
+                    raise RuntimeError("conversation_logs insert returned no id")
+            else:
+                await self.db.append_conversation_turns(self.session_id, batch)
+        except Exception as e:
+            logger.error("Error persisting %d turns for %s, will retry: %s", len(batch), self.child_id, e)
+            self._pending = batch + self._pending
+            return False
+        self._unchunked.extend(batch)
+        return True
+
+    async def _embed_windows(self, final: bool, raise_errors: bool = False):
+        """
+        Embeds every complete window of CHUNK_WINDOW_TURNS turns, each overlapping the
+        previous one by CHUNK_OVERLAP_TURNS. With `final`, the remaining turns form the last window.
+        Failures are logged during the session; with `raise_errors` they propagate, so a spooled
+        job is retried.
+        """
+        window = config.CHUNK_WINDOW_TURNS
+        step = max(window - config.CHUNK_OVERLAP_TURNS, 1)
+        chunks = []
+        while len(self._unchunked) >= window:
+            chunks.append(self._window(self._unchunked[:window]))
+            self._unchunked = self._unchunked[step:]
+            self._chunk_offset += step
+        # At close, the last window ends at the last turn
+        if final and self._chunk_offset + len(self._unchunked) > self._chunked_until:
+            chunks.append(self._window(self._unchunked))
+        if not chunks:
+            return
+        try:
+            embeddings = await get_embedding_service().embed_many([c.content for c in chunks], cache=False)
+            await self.db.log_conversation_chunks(self.session_id, self.child_id, chunks, embeddings)
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error("Error embedding transcript chunks for %s: %s", self.child_id, e)
+
+    def _window(self, turns: list[dict]) -> TurnWindow:
+        chunk = TurnWindow(
+            turn_start=self._chunk_offset,
+            turn_end=self._chunk_offset + len(turns),
+            content=format_transcript(turns),
+        )
+        self._chunked_until = max(self._chunked_until, chunk.turn_end)
+        return chunk
+
+    async def detach(self) -> dict:
+        """
+        Stops background flushing and hands over everything not yet persisted, so the
+        rest of the transcript can be finished by a spooled job after the session ends.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._flushing is not None:
+            await asyncio.shield(self._flushing)
+        async with self._lock:
+            state = self.state()
+            self._pending, self._unchunked = [], []
+        _open_writers.discard(self)
+        return state
+
+    def state(self) -> dict:
+        return {
+            "child_id": self.child_id,
+            "session_id": self.session_id,
+            "pending": self._pending,
+            "unchunked": self._unchunked,
+            "chunk_offset": self._chunk_offset,
+            "chunked_until": self._chunked_until,
+        }
+
+    @classmethod
+    def from_state(cls, db, state: dict) -> "TranscriptWriter":
+        writer = cls(db, state["child_id"])
+        writer.session_id = state["session_id"]
+        writer._pending = state["pending"]
+        writer._unchunked = state["unchunked"]
+        writer._chunk_offset = state["chunk_offset"]
+        writer._chunked_until = state["chunked_until"]
+        return writer
+
+    async def persist_tail(self, check_stored: bool = False):
+        """
+        Writes the turns still pending when the session ended, raising if they could not be
+        persisted. With `check_stored` (a retried job), turns the conversation row already
+        holds are skipped, so they are never appended twice.
+        """
+        async with self._lock:
+            if check_stored and self._pending and self.session_id is not None:
+                persisted = self._chunk_offset + len(self._unchunked)
+                stored = await self.db.count_conversation_turns(self.session_id)
+                already = min(max(stored - persisted, 0), len(self._pending))
+                if already:
+                    self._unchunked.extend(self._pending[:already])
+                    self._pending = self._pending[already:]
+            await self._persist_pending()
+        if self._pending:
+            raise RuntimeError(f"{len(self._pending)} turns for {self.child_id} were not persisted")
+
+    async def finish_windows(self):
+        """
+        Embeds the windows left after `persist_tail`, the last one ending at the last turn,
+        raising if they could not be stored.
+        """
+        async with self._lock:
+            await self._embed_windows(final=True, raise_errors=True)
+
+    async def close(self):
+        """Flushes the remaining turns and the final window."""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._flushing is not None:
+            await asyncio.shield(self._flushing)
+        await self.flush(final=True)
+        if not self._pending:
+            _open_writers.discard(self)
+
+
+async def close_all_writers():
+    """Flushes every session transcript still buffered in this process."""
+    await asyncio.gather(*(writer.close() for writer in list(_open_writers)), return_exceptions=True)
@@ -0,0 +1,102 @@
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("livekit.vector_index")
+
+# child_id -> index loaded for an active session
+_indexes: dict[str, "ChildVectorIndex"] = {}
+# child_id -> live sessions using that child's index
+_claims: dict[str, int] = {}
+
+
+def _as_vector(embedding) -> np.ndarray:
+    # pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+class ChildVectorIndex:
+    """
+    In-process copy of one child's conversation chunk embeddings, answering similarity
+    queries with the same threshold/count semantics as the `match_conversation_chunks` RPC.
+    """
+
+    def __init__(self, child_id: str, rows: list[dict]):
+        self.child_id = child_id
+        self.contents: list = []
+        self._vectors: list[np.ndarray] = []
+        self._matrix: np.ndarray | None = None
+        for row in rows:
+            if row.get("embedding") is not None:
+                self.add(row.get("content"), row["embedding"])
+
+    def __len__(self):
+        return len(self.contents)
+
+    def add(self, content, embedding):
+        vector = _as_vector(embedding)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        self.contents.append(content)
+        self._vectors.append(vector / norm)
+        self._matrix = None
+
+    def query(self, embedding, match_threshold: float = 0.50, match_count: int = 5) -> list[dict]:
+        """Rows whose cosine similarity exceeds `match_threshold`, best first, at most `match_count`."""
+        if not self.contents:
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors)
+        query = _as_vector(embedding)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        similarities = self._matrix @ (query / norm)
+        candidates = np.flatnonzero(similarities > match_threshold)
+        best = candidates[np.argsort(-similarities[candidates], kind="stable")][:match_count]
+        return [{"content": self.contents[i], "similarity": float(similarities[i])} for i in best]
+
+
+async def load_index(db, child_id: str) -> ChildVectorIndex | None:
+    """Loads a child's conversation embeddings for the duration of their session."""
+    try:
+        rows = await db.get_conversation_embeddings(child_id)
+    except Exception as e:
+        logger.error("Error loading vector index for %s: %s", child_id, e)
+        return None
+    index = ChildVectorIndex(child_id, rows)
+    _indexes[child_id] = index
+    logger.info("Loaded local vector index for %s with %s vectors", child_id, len(index))
+    return index
+
+
+def get_index(child_id: str) -> ChildVectorIndex | None:
+    return _indexes.get(child_id)
+
+
+def evict_index(child_id: str):
+    if _indexes.pop(child_id, None) is not None:
+        logger.info("Evicted local vector index for %s", child_id)
+
+
+def claim_index(child_id: str):
+    """Marks a child's index as in use by a live session until `release_index`."""
+    _claims[child_id] = _claims.get(child_id, 0) + 1
+
+
+def release_index(child_id: str):
+    """Ends a session's claim; the index is evicted once no session of that child is left."""
+    remaining = _claims.get(child_id, 0) - 1
+    if remaining > 0:
+        _claims[child_id] = remaining
+        return
+    _claims.pop(child_id, None)
+    evict_index(child_id)
+
+
+def is_claimed(child_id: str) -> bool:
+    return child_id in _claims
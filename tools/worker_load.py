@@ -0,0 +1,77 @@
+import logging
+from collections import deque
+
+import psutil
+from livekit.agents import JobRequest
+
+import config
+from tools.worker_metrics import WORKER_LOAD, JOBS_REJECTED, worker_monitor
+
+logger = logging.getLogger("livekit.worker_load")
+
+
+class WorkerLoad:
+    """
+    Load score reported to LiveKit for dispatch. CPU, event loop lag and running jobs are
+    each scaled so that 1.0 means saturated, and the worker is as loaded as its busiest
+    resource. Samples are taken every time LiveKit polls the load (every 0.5s) and
+    smoothed over `window` samples: CPU averaged, loop lag by its worst recent sample.
+    """
+
+    def __init__(self, threshold: float, max_loop_lag: float, max_jobs: int, window: int):
+        self.threshold = threshold
+        self.max_loop_lag = max_loop_lag
+        self.max_jobs = max_jobs
+        self._cpu: deque[float] = deque(maxlen=window)
+        self._lag: deque[float] = deque(maxlen=window)
+        self.components = {"cpu": 0.0, "loop_lag": 0.0, "jobs": 0.0}
+        self.load = 0.0
+        self.rejected = 0
+        # The first call only starts psutil's measurement interval
+        psutil.cpu_percent(interval=None)
+
+    def __call__(self, worker) -> float:
+        """The worker's `load_fnc`; LiveKit calls it from a thread pool."""
+        self._cpu.append(psutil.cpu_percent(interval=None) / 100)
+        self._lag.append(worker_monitor.loop_lag)
+        self.components = {
+            "cpu": sum(self._cpu) / len(self._cpu),
+            "loop_lag": max(self._lag) / self.max_loop_lag,
+            "jobs": len(worker.active_jobs) / self.max_jobs,
+        }
+        self.load = min(1.0, max(self.components.values()))
+        WORKER_LOAD.set(self.load)
+        return self.load
+
+    @property
+    def overloaded(self) -> bool:
+        return self.load >= self.threshold
+
+    async def request_fnc(self, request: JobRequest):
+        """
+        Refuses jobs while over the threshold. LiveKit stops dispatching to a full worker on
+        its own, but only after the next status update; this covers the jobs sent meanwhile.
+        """
+        if self.overloaded:
+            self.rejected += 1
+            JOBS_REJECTED.inc()
+            logger.warning("Rejecting job %s, worker load %.2f: %s", request.id, self.load, self.metrics()['components'])
+            await request.reject()
+            return
+        await request.accept()
+
+    def metrics(self) -> dict:
+        return {
+            "load": round(self.load, 3),
+            "threshold": self.threshold,
+            "components": {name: round(value, 3) for name, value in self.components.items()},
+            "rejected": self.rejected,
+        }
+
+
+worker_load = WorkerLoad(
+    threshold=config.LOAD_THRESHOLD,
+    max_loop_lag=config.LOAD_MAX_LOOP_LAG,
+    max_jobs=config.LOAD_MAX_JOBS,
+    window=config.LOAD_WINDOW,
+)
@@ -0,0 +1,291 @@
+import asyncio
+import functools
+import glob
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Callable
+
+import psutil
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+import config
+from tools.structured_logging import dropped_records
+
+logger = logging.getLogger("livekit.worker_metrics")
+
+# Sessions run in job processes, the /metrics endpoint in the main one; every process writes its
+# samples to PROMETHEUS_MULTIPROC_DIR (see tools.metrics_dir) and the endpoint aggregates them
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+ACTIVE_SESSIONS = Gauge(
+    "nijo_active_sessions", "Sessions in progress, by the agent currently handling them",
+    ["agent"], multiprocess_mode="livesum",
+)
+BOOTSTRAP_SECONDS = Histogram(
+    "nijo_bootstrap_fetch_seconds", "Duration of each session bootstrap fetch",
+    ["fetch", "status"], buckets=LATENCY_BUCKETS,
+)
+BOOTSTRAP_WAIT_SECONDS = Histogram(
+    "nijo_bootstrap_wait_seconds", "Time a joining participant waited for the session bootstrap",
+    buckets=LATENCY_BUCKETS,
+)
+CALL_SECONDS = Histogram(
+    "nijo_call_seconds", "Latency of DB and OpenAI calls by call site",
+    ["service", "call"], buckets=LATENCY_BUCKETS,
+)
+CALL_ERRORS = Counter(
+    "nijo_call_errors_total", "Failed DB and OpenAI calls by call site",
+    ["service", "call"],
+)
+PIPELINE_SECONDS = Histogram(
+    "nijo_pipeline_seconds", "Voice pipeline latencies reported by livekit-agents",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+LOOP_LAG_SECONDS = Gauge(
+    "nijo_event_loop_lag_seconds", "Most recent event loop lag of each process",
+    multiprocess_mode="liveall",
+)
+LOOP_LAG_HISTOGRAM = Histogram(
+    "nijo_event_loop_lag_histogram_seconds", "Event loop lag samples",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+QUEUE_DEPTH = Gauge(
+    "nijo_queue_depth", "Items waiting in per-process background queues",
+    ["queue"], multiprocess_mode="livesum",
+)
+SHARED_QUEUE_DEPTH = Gauge(
+    "nijo_shared_queue_depth", "Items waiting in queues shared by every process on the host",
+    ["queue"], multiprocess_mode="livemax",
+)
+PROCESS_MEMORY_BYTES = Gauge(
+    "nijo_process_memory_bytes", "Resident memory of each worker and job process",
+    ["role"], multiprocess_mode="liveall",
+)
+WORKER_LOAD = Gauge(
+    "nijo_worker_load", "Load score reported to LiveKit for job dispatch",
+    multiprocess_mode="liveall",
+)
+JOBS_REJECTED = Counter(
+    "nijo_jobs_rejected_total", "Job requests refused because the worker was over its load threshold",
+)
+INTENT_DECISIONS = Counter(
+    "nijo_intent_decisions_total", "Turn routing decisions by the source that made them and the intent picked",
+    ["source", "intent"],
+)
+INTENT_SECONDS = Histogram(
+    "nijo_intent_seconds", "Time to route a turn, by decision source",
+    ["source"], buckets=LATENCY_BUCKETS,
+)
+INTENT_CONFIDENCE = Histogram(
+    "nijo_intent_confidence", "Confidence of turn routing decisions, by decision source",
+    ["source"], buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+PROMPT_SECTION_TOKENS = Histogram(
+    "nijo_prompt_section_tokens", "Tokens each section of an assembled system prompt took",
+    ["prompt", "section"], buckets=(0, 25, 50, 100, 200, 400, 800, 1600, 3200),
+)
+PROMPT_SECTIONS = Counter(
+    "nijo_prompt_sections_total", "Prompt sections assembled, by whether they were kept, truncated or dropped",
+    ["prompt", "section", "outcome"],
+)
+EMBED_CACHE_LOOKUPS = Counter(
+    "nijo_embedding_cache_lookups_total", "Embedding cache lookups by the tier that answered them",
+    ["result"],
+)
+LOG_RECORDS_DROPPED = Gauge(
+    "nijo_log_records_dropped", "Log records dropped because the log queue was full",
+    multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def track_call(service: str, call: str):
+    """Times one DB or OpenAI call and counts it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, asyncio.CancelledError):
+            CALL_ERRORS.labels(service, call).inc()
+        raise
+    finally:
+        CALL_SECONDS.labels(service, call).observe(time.perf_counter() - start)
+
+
+def timed_call(service: str, call: str):
+    """`track_call` for every call of the decorated coroutine function."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with track_call(service, call):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_pipeline(metrics):
+    """Records the latencies in a livekit-agents `metrics_collected` event."""
+    kind = getattr(metrics, "type", None)
+    if kind == "llm_metrics":
+        PIPELINE_SECONDS.labels("llm_ttft").observe(metrics.ttft)
+        PIPELINE_SECONDS.labels("llm_duration").observe(metrics.duration)
+    elif kind == "tts_metrics":
+        PIPELINE_SECONDS.labels("tts_ttfb").observe(metrics.ttfb)
+    elif kind == "eou_metrics":
+        PIPELINE_SECONDS.labels("end_of_utterance").observe(metrics.end_of_utterance_delay)
+
+
+class WorkerMonitor:
+    """
+    Per-process sampler: probes the event loop lag every LOOP_LAG_INTERVAL seconds and
+    refreshes the session and queue gauges every METRICS_SAMPLE_INTERVAL seconds.
+    """
+
+    def __init__(self, lag_interval: float, sample_interval: float):
+        self.lag_interval = lag_interval
+        self.sample_interval = sample_interval
+        self.loop_lag = 0.0
+        self._sessions = weakref.WeakSet()
+        # name -> (depth function, shared between processes)
+        self._queues: dict[str, tuple[Callable[[], int], bool]] = {}
+        self._agents_seen: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self._process = psutil.Process()
+        # "worker" for the process serving /metrics, "job" for prewarmed job processes
+        self.role = "worker"
+
+    def watch_queue(self, name: str, depth: Callable[[], int], shared: bool = False):
+        """Samples `depth()` (off the event loop) into the queue depth gauge."""
+        self._queues[name] = (depth, shared)
+
+    def track_session(self, session):
+        """Counts an AgentSession as active, under its current agent, until it closes."""
+        self._sessions.add(session)
+        session.on("close", lambda _event: self._sessions.discard(session))
+
+    @property
+    def active_sessions(self) -> int:
+        return len(self._sessions)
+
+    def memory_mb(self) -> float:
+        return self._process.memory_info().rss / 2**20
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="worker_monitor")
+
+    async def _run(self):
+        next_sample = 0.0
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(0.0, time.perf_counter() - expected)
+            LOOP_LAG_SECONDS.set(self.loop_lag)
+            LOOP_LAG_HISTOGRAM.observe(self.loop_lag)
+
+            if time.monotonic() >= next_sample:
+                next_sample = time.monotonic() + self.sample_interval
+                try:
+                    await self._sample()
+                except Exception as e:
+                    logger.warning("Metrics sampling failed: %r", e)
+
+    async def _sample(self):
+        agents: dict[str, int] = {}
+        for session in list(self._sessions):
+            try:
+                name = type(session.current_agent).__name__
+            except RuntimeError:
+                # Not started yet
+                name = "none"
+            agents[name] = agents.get(name, 0) + 1
+        self._agents_seen.update(agents)
+        for name in self._agents_seen:
+            ACTIVE_SESSIONS.labels(name).set(agents.get(name, 0))
+
+        for name, (depth, shared) in self._queues.items():
+            gauge = SHARED_QUEUE_DEPTH if shared else QUEUE_DEPTH
+            gauge.labels(name).set(await asyncio.to_thread(depth))
+        LOG_RECORDS_DROPPED.set(dropped_records())
+        PROCESS_MEMORY_BYTES.labels(self.role).set(self._process.memory_info().rss)
+
+    def metrics(self) -> dict:
+        return {
+            "loop_lag_seconds": round(self.loop_lag, 4),
+            "active_sessions": self.active_sessions,
+            "memory_mb": round(self.memory_mb(), 1),
+        }
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+        if MULTIPROCESS:
+            # Drops this process' live gauges from the aggregate
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(os.getpid())
+
+
+worker_monitor = WorkerMonitor(config.LOOP_LAG_INTERVAL, config.METRICS_SAMPLE_INTERVAL)
+
+
+# Concurrent scrapes must not merge the same dead process' files twice
+_compaction_lock = threading.Lock()
+
+
+def _forget_dead_processes():
+    """
+    Drops the live gauges of dead job processes and folds their counters and histograms into
+    one aggregate file per type, so the directory (and each scrape) does not grow with every
+    single-use job process the worker has run.
+    """
+    from prometheus_client import multiprocess
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    files: dict[int, list[str]] = {}
+    for file in glob.glob(os.path.join(path, "*_*.db")):
+        match = re.search(r"_(\d+)\.db$", file)
+        if match:
+            files.setdefault(int(match.group(1)), []).append(file)
+    for pid, pid_files in files.items():
+        if psutil.pid_exists(pid):
+            continue
+        for file in pid_files:
+            kind = os.path.basename(file).split("_")[0]
+            if kind in ("counter", "histogram", "summary"):
+                _merge_into(os.path.join(path, f"{kind}_aggregate.db"), file)
+        multiprocess.mark_process_dead(pid, path)
+
+
+def _merge_into(aggregate_path: str, file: str):
+    """Adds every sample of a dead process' file to the aggregate file, then removes it."""
+    from prometheus_client.mmap_dict import MmapedDict
+    aggregate = MmapedDict(aggregate_path)
+    try:
+        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(file):
+            total, _ = aggregate.read_value(key)
+            aggregate.write_value(key, total + value, timestamp)
+    finally:
+        aggregate.close()
+    os.remove(file)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    The exposition payload and its content type, aggregated over every process in multiprocess
+    mode. Reads (and compacts) files, so call it off the event loop.
+    """
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        with _compaction_lock:
+            _forget_dead_processes()
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST